@@ -0,0 +1,237 @@
+import frappe
+import numpy as np
+from frappe.utils import nowdate, getdate, cint, flt
+
+from gestion_tiempo.archive import union_sql
+
+
+CACHE_KEY = "gestion_tiempo:cohort_analytics"
+CACHE_TTL = 60 * 60 * 24
+
+
+def month_index(date):
+    """Months since year 0, the integer key used for cohorts"""
+    date = getdate(date)
+    return date.year * 12 + date.month - 1
+
+
+def month_label(index):
+    """Format a month index as YYYY-MM"""
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def load_subscriptions():
+    """Load every subscription as columnar NumPy arrays.
+
+    Dates come back from SQL already converted to month indexes so no
+    per-row date parsing happens in Python. Subscriptions that are still
+    running get a churn month of -1. Archived subscriptions are included.
+    """
+    subscriptions = union_sql(
+        "Subscription",
+        ["name", "plan", "status", "start_date", "end_date", "cancellation_date"]
+    )
+    rows = frappe.db.sql(f"""
+        SELECT
+            name,
+            plan,
+            YEAR(start_date) * 12 + MONTH(start_date) - 1 as start_month,
+            CASE
+                WHEN status IN ('Cancelled', 'Expired') THEN
+                    YEAR(COALESCE(cancellation_date, end_date)) * 12
+                    + MONTH(COALESCE(cancellation_date, end_date)) - 1
+                ELSE -1
+            END as churn_month
+        FROM {subscriptions} s
+        WHERE start_date IS NOT NULL
+    """)
+
+    if not rows:
+        return {
+            "name": np.array([], dtype=str),
+            "plan": np.array([], dtype=np.int32),
+            "plans": np.array([], dtype=str),
+            "start_month": np.array([], dtype=np.int32),
+            "churn_month": np.array([], dtype=np.int32),
+        }
+
+    names, plans, start_month, churn_month = zip(*rows)
+    names = np.array(names, dtype=str)
+    # Keep rows sorted by name so payments can be matched with searchsorted
+    order = np.argsort(names, kind="stable")
+    plan_names, plan_codes = np.unique(np.array(plans, dtype=str)[order], return_inverse=True)
+
+    return {
+        "name": names[order],
+        "plan": plan_codes.astype(np.int32),
+        "plans": plan_names,
+        "start_month": np.array(start_month, dtype=np.int32)[order],
+        "churn_month": np.array(churn_month, dtype=np.int32)[order],
+    }
+
+
+def load_payments():
+    """Load completed payments, archived ones included, as columnar NumPy arrays"""
+    payments = union_sql("Payment", ["subscription", "amount", "payment_date", "status"])
+    rows = frappe.db.sql(f"""
+        SELECT
+            subscription,
+            amount,
+            YEAR(payment_date) * 12 + MONTH(payment_date) - 1 as payment_month
+        FROM {payments} p
+        WHERE status = 'Completed'
+        AND subscription IS NOT NULL AND subscription != ''
+    """)
+
+    if not rows:
+        return {
+            "subscription": np.array([], dtype=str),
+            "amount": np.array([], dtype=np.float64),
+            "payment_month": np.array([], dtype=np.int32),
+        }
+
+    subscriptions, amounts, payment_month = zip(*rows)
+
+    return {
+        "subscription": np.array(subscriptions, dtype=str),
+        "amount": np.array(amounts, dtype=np.float64),
+        "payment_month": np.array(payment_month, dtype=np.int32),
+    }
+
+
+def match_payments(subs, payments):
+    """Return the subscription row of each payment, or -1 when unknown"""
+    if not len(subs["name"]) or not len(payments["subscription"]):
+        return np.full(len(payments["subscription"]), -1, dtype=np.int64)
+
+    idx = np.searchsorted(subs["name"], payments["subscription"])
+    idx = np.minimum(idx, len(subs["name"]) - 1)
+    found = subs["name"][idx] == payments["subscription"]
+    return np.where(found, idx, -1)
+
+
+def compute_cohorts(subs, payments, current_month, months=12):
+    """Cohort retention and cumulative revenue matrices.
+
+    Cohorts are keyed by the subscription start month. `retention[c][k]`
+    is the share of cohort `c` still subscribed at the start of month `k`;
+    ages that have not happened yet are returned as None.
+    """
+    first_month = current_month - months + 1
+    in_range = (subs["start_month"] >= first_month) & (subs["start_month"] <= current_month)
+    start = subs["start_month"][in_range]
+    churn = subs["churn_month"][in_range]
+
+    cohort = start - first_month
+    age = np.where(churn < 0, months, churn - start)
+    age = np.clip(age, 0, months)
+
+    counts = np.zeros((months, months + 1), dtype=np.int64)
+    np.add.at(counts, (cohort, age), 1)
+    # survivors[c, k] = subscriptions of cohort c with age >= k
+    survivors = counts[:, ::-1].cumsum(axis=1)[:, ::-1][:, :months]
+    sizes = survivors[:, 0]
+
+    observable = np.arange(months)[None, :] <= (months - 1 - np.arange(months))[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        retention = np.where(sizes[:, None] > 0, survivors / sizes[:, None], 0.0)
+
+    revenue = np.zeros((months, months), dtype=np.float64)
+    sub_idx = match_payments(subs, payments)
+    known = sub_idx >= 0
+    pay_start = subs["start_month"][sub_idx[known]]
+    pay_age = payments["payment_month"][known] - pay_start
+    pay_cohort = pay_start - first_month
+    valid = (pay_cohort >= 0) & (pay_age >= 0) & (pay_age < months)
+    np.add.at(revenue, (pay_cohort[valid], pay_age[valid]), payments["amount"][known][valid])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cumulative = np.where(sizes[:, None] > 0, revenue.cumsum(axis=1) / sizes[:, None], 0.0)
+
+    cohorts = []
+    for c in range(months):
+        if not sizes[c]:
+            continue
+        mask = observable[c]
+        cohorts.append({
+            "cohort": month_label(first_month + c),
+            "size": int(sizes[c]),
+            "retention": [round(float(v), 4) if m else None for v, m in zip(retention[c], mask)],
+            "revenue_per_subscription": [round(float(v), 2) if m else None for v, m in zip(cumulative[c], mask)],
+        })
+
+    return cohorts
+
+
+def compute_plan_metrics(subs, payments, current_month):
+    """ARPU, monthly churn and LTV per plan.
+
+    Exposure is counted in subscription-months, so ARPU is revenue per
+    subscription-month and LTV is ARPU divided by the monthly churn rate.
+    """
+    n_plans = len(subs["plans"])
+    if not n_plans:
+        return []
+
+    end = np.where(subs["churn_month"] < 0, current_month, subs["churn_month"])
+    exposure_months = np.maximum(end - subs["start_month"], 0) + 1
+
+    exposure = np.bincount(subs["plan"], weights=exposure_months, minlength=n_plans)
+    subscribers = np.bincount(subs["plan"], minlength=n_plans)
+    churned = np.bincount(subs["plan"], weights=(subs["churn_month"] >= 0), minlength=n_plans)
+
+    sub_idx = match_payments(subs, payments)
+    known = sub_idx >= 0
+    revenue = np.bincount(
+        subs["plan"][sub_idx[known]],
+        weights=payments["amount"][known],
+        minlength=n_plans
+    )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        arpu = np.where(exposure > 0, revenue / exposure, 0.0)
+        churn_rate = np.where(exposure > 0, churned / exposure, 0.0)
+        ltv = np.where(churn_rate > 0, arpu / churn_rate, np.nan)
+
+    return [
+        {
+            "plan": str(subs["plans"][i]),
+            "subscriptions": int(subscribers[i]),
+            "revenue": flt(revenue[i], 2),
+            "arpu": flt(arpu[i], 2),
+            "monthly_churn_rate": round(float(churn_rate[i]) * 100, 2),
+            "ltv": None if np.isnan(ltv[i]) else flt(ltv[i], 2),
+        }
+        for i in range(n_plans)
+    ]
+
+
+def build_cohort_analytics(months=12):
+    """Load subscriptions and payments once and compute every metric"""
+    current_month = month_index(nowdate())
+    subs = load_subscriptions()
+    payments = load_payments()
+
+    return {
+        "generated_on": nowdate(),
+        "months": months,
+        "cohorts": compute_cohorts(subs, payments, current_month, months),
+        "plans": compute_plan_metrics(subs, payments, current_month),
+    }
+
+
+@frappe.whitelist()
+def get_cohort_analytics(months=12, refresh=0):
+    """Get cohort retention, ARPU and LTV by plan (cached per day)"""
+    months = min(max(cint(months), 1), 60)
+    key = f"{CACHE_KEY}:{nowdate()}:{months}"
+    cache = frappe.cache()
+
+    if not cint(refresh):
+        cached = cache.get_value(key)
+        if cached:
+            return cached
+
+    data = build_cohort_analytics(months)
+    cache.set_value(key, data, expires_in_sec=CACHE_TTL)
+    return data
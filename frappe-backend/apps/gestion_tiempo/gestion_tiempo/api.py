@@ -3,6 +3,11 @@ from frappe import _
 from frappe.utils import nowdate, add_days, add_months, getdate, flt
 from datetime import datetime, timedelta
 
+from gestion_tiempo.archive import union_sql
+from gestion_tiempo.encoding import encode_response
+from gestion_tiempo.gestion_tiempo.doctype.subscription.subscription import ActiveSubscriptionError
+from gestion_tiempo.search import sanitize_filters
+
 
 @frappe.whitelist(allow_guest=True)
 def get_subscription_plans():
@@ -88,15 +93,16 @@ def get_dashboard_stats():
         GROUP BY sp.plan_name
     """, as_dict=True)
 
-    # Monthly revenue trend (last 6 months)
+    # Monthly revenue trend (last 6 months), including archived payments
+    payments = union_sql("Payment", ["amount", "payment_date", "status"])
     revenue_trend = []
     for i in range(5, -1, -1):
         month_start = add_months(getdate(nowdate()).replace(day=1), -i)
         month_end = add_months(month_start, 1)
 
-        month_revenue = frappe.db.sql("""
+        month_revenue = frappe.db.sql(f"""
             SELECT COALESCE(SUM(amount), 0) as total
-            FROM `tabPayment`
+            FROM {payments} p
             WHERE status = 'Completed'
             AND payment_date >= %s AND payment_date < %s
         """, (month_start, month_end), as_dict=True)
@@ -129,14 +135,6 @@ def create_subscription(customer, plan, billing_cycle="Monthly"):
     if not frappe.db.exists("Subscription Plan", plan):
         frappe.throw(_("Subscription plan not found"))
 
-    # Check if customer already has an active subscription
-    existing = frappe.db.exists(
-        "Subscription",
-        {"customer": customer, "status": "Active"}
-    )
-    if existing:
-        frappe.throw(_("Customer already has an active subscription"))
-
     # Get plan details
     plan_doc = frappe.get_doc("Subscription Plan", plan)
 
@@ -158,7 +156,12 @@ def create_subscription(customer, plan, billing_cycle="Monthly"):
         "end_date": end_date,
         "next_billing_date": end_date
     })
-    subscription.insert()
+    # One active subscription per customer is enforced by a unique index
+    try:
+        subscription.insert()
+    except ActiveSubscriptionError:
+        frappe.clear_messages()
+        frappe.throw(_("Customer already has an active subscription"))
 
     return subscription
 
@@ -300,7 +303,7 @@ def get_customer_details(customer_email):
 
 
 @frappe.whitelist()
-def get_customers_list(filters=None, page=1, page_size=20):
+def get_customers_list(filters=None, page=1, page_size=20, response_format=None):
     """Get paginated list of customers"""
     start = (int(page) - 1) * int(page_size)
 
@@ -309,7 +312,7 @@ def get_customers_list(filters=None, page=1, page_size=20):
         if isinstance(filters, str):
             import json
             filters = json.loads(filters)
-        query_filters = filters
+        query_filters = sanitize_filters(filters)
 
     customers = frappe.get_all(
         "Customer",
@@ -335,17 +338,17 @@ def get_customers_list(filters=None, page=1, page_size=20):
 
     total = frappe.db.count("Customer", filters=query_filters)
 
-    return {
+    return encode_response({
         "customers": customers,
         "total": total,
         "page": int(page),
         "page_size": int(page_size),
         "total_pages": -(-total // int(page_size))  # Ceiling division
-    }
+    }, "customers", response_format)
 
 
 @frappe.whitelist()
-def get_subscriptions_list(filters=None, page=1, page_size=20):
+def get_subscriptions_list(filters=None, page=1, page_size=20, response_format=None):
     """Get paginated list of subscriptions"""
     start = (int(page) - 1) * int(page_size)
 
@@ -376,17 +379,17 @@ def get_subscriptions_list(filters=None, page=1, page_size=20):
 
     total = frappe.db.count("Subscription", filters=query_filters)
 
-    return {
+    return encode_response({
         "subscriptions": subscriptions,
         "total": total,
         "page": int(page),
         "page_size": int(page_size),
         "total_pages": -(-total // int(page_size))
-    }
+    }, "subscriptions", response_format)
 
 
 @frappe.whitelist()
-def get_payments_list(filters=None, page=1, page_size=20):
+def get_payments_list(filters=None, page=1, page_size=20, response_format=None):
     """Get paginated list of payments"""
     start = (int(page) - 1) * int(page_size)
 
@@ -414,17 +417,17 @@ def get_payments_list(filters=None, page=1, page_size=20):
 
     total = frappe.db.count("Payment", filters=query_filters)
 
-    return {
+    return encode_response({
         "payments": payments,
         "total": total,
         "page": int(page),
         "page_size": int(page_size),
         "total_pages": -(-total // int(page_size))
-    }
+    }, "payments", response_format)
 
 
 @frappe.whitelist()
-def export_report(report_type, date_from=None, date_to=None, format="csv"):
+def export_report(report_type, date_from=None, date_to=None, format="csv", response_format=None):
     """Export report data"""
     if report_type == "customers":
         data = frappe.get_all(
@@ -432,33 +435,42 @@ def export_report(report_type, date_from=None, date_to=None, format="csv"):
             fields=["full_name", "email", "phone", "company", "creation"]
         )
     elif report_type == "subscriptions":
-        data = frappe.db.sql("""
+        subscriptions = union_sql(
+            "Subscription",
+            ["customer", "plan", "status", "billing_cycle", "start_date", "end_date"]
+        )
+        data = frappe.db.sql(f"""
             SELECT
                 c.full_name, c.email, sp.plan_name, s.status,
                 s.billing_cycle, s.start_date, s.end_date
-            FROM `tabSubscription` s
+            FROM {subscriptions} s
             JOIN `tabCustomer` c ON s.customer = c.name
             JOIN `tabSubscription Plan` sp ON s.plan = sp.name
             WHERE (%s IS NULL OR s.start_date >= %s)
             AND (%s IS NULL OR s.end_date <= %s)
         """, (date_from, date_from, date_to, date_to), as_dict=True)
     elif report_type == "payments":
-        data = frappe.db.sql("""
+        payments = union_sql(
+            "Payment",
+            ["customer", "amount", "payment_date", "payment_method", "status", "transaction_id"]
+        )
+        data = frappe.db.sql(f"""
             SELECT
                 c.full_name, c.email, p.amount, p.payment_date,
                 p.payment_method, p.status, p.transaction_id
-            FROM `tabPayment` p
+            FROM {payments} p
             JOIN `tabCustomer` c ON p.customer = c.name
             WHERE (%s IS NULL OR p.payment_date >= %s)
             AND (%s IS NULL OR p.payment_date <= %s)
         """, (date_from, date_from, date_to, date_to), as_dict=True)
     elif report_type == "revenue":
-        data = frappe.db.sql("""
+        payments = union_sql("Payment", ["amount", "payment_date", "status"])
+        data = frappe.db.sql(f"""
             SELECT
                 DATE_FORMAT(payment_date, '%%Y-%%m') as month,
                 SUM(amount) as total_revenue,
                 COUNT(*) as payment_count
-            FROM `tabPayment`
+            FROM {payments} p
             WHERE status = 'Completed'
             AND (%s IS NULL OR payment_date >= %s)
             AND (%s IS NULL OR payment_date <= %s)
@@ -468,7 +480,7 @@ def export_report(report_type, date_from=None, date_to=None, format="csv"):
     else:
         frappe.throw(_("Invalid report type"))
 
-    return data
+    return encode_response(data, response_format=response_format)
 
 
 @frappe.whitelist()
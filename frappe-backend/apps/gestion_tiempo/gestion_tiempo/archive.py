@@ -0,0 +1,219 @@
+import time
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, nowdate, now_datetime, cint
+
+from gestion_tiempo.changes import drop_tombstones, record_tombstones
+
+
+CHUNK_SIZE = 1000
+THROTTLE = 0.05
+
+# Which rows are cold, and how old they must be (in days) before moving.
+# Payments go first: a subscription is only archived once none of its
+# payments are left in the hot table, so their links keep resolving.
+ARCHIVE_RULES = {
+    "Payment": {
+        "condition": "payment_date < %(cutoff)s",
+        "config_key": "archive_payment_days",
+        "default_days": 730,
+    },
+    "Subscription": {
+        "condition": """status IN ('Cancelled', 'Expired') AND modified < %(cutoff)s
+            AND NOT EXISTS (
+                SELECT 1 FROM `tabPayment` p WHERE p.subscription = `tabSubscription`.name
+            )""",
+        "config_key": "archive_subscription_days",
+        "default_days": 180,
+    },
+}
+
+
+def archive_table(doctype):
+    # Not `tab`-prefixed: Frappe treats such tables without a DocType as
+    # orphans and `bench trim-database` drops them
+    return f"archive_{frappe.scrub(doctype)}"
+
+
+def legacy_archive_table(doctype):
+    return f"tab{doctype} Archive"
+
+
+def union_sql(doctype, columns):
+    """Derived table reading `columns` across the hot and archive tables.
+
+    Use it in place of `tab{doctype}` in reporting queries, aliased like
+    the table it replaces.
+    """
+    cols = ", ".join(f"`{column}`" for column in columns)
+    return f"""(
+        SELECT {cols} FROM `tab{doctype}`
+        UNION ALL
+        SELECT {cols} FROM `{archive_table(doctype)}`
+    )"""
+
+
+def stored_columns(table):
+    """Columns of `table` that hold data, skipping generated ones"""
+    return [
+        column.Field
+        for column in frappe.db.sql(f"SHOW COLUMNS FROM `{table}`", as_dict=True)
+        if "GENERATED" not in (column.Extra or "").upper()
+    ]
+
+
+def common_columns(doctype):
+    archived = set(stored_columns(archive_table(doctype)))
+    return [column for column in stored_columns(f"tab{doctype}") if column in archived]
+
+
+def existing_tables(tables):
+    return set(frappe.db.sql_list("""
+        SELECT table_name FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name IN %s
+    """, (tuple(tables),)))
+
+
+def setup_archive_tables():
+    """Create archive tables and add columns the hot tables gained since"""
+    for doctype in ARCHIVE_RULES:
+        table = archive_table(doctype)
+        legacy = legacy_archive_table(doctype)
+        existing = existing_tables([table, legacy])
+        if legacy in existing and table not in existing:
+            frappe.db.sql_ddl(f"RENAME TABLE `{legacy}` TO `{table}`")
+        frappe.db.sql_ddl(f"CREATE TABLE IF NOT EXISTS `{table}` LIKE `tab{doctype}`")
+
+        archived = set(frappe.db.sql_list(f"SHOW COLUMNS FROM `{table}`"))
+        for column in frappe.db.sql(f"SHOW COLUMNS FROM `tab{doctype}`", as_dict=True):
+            if column.Field not in archived and "GENERATED" not in (column.Extra or "").upper():
+                frappe.db.sql_ddl(f"ALTER TABLE `{table}` ADD COLUMN `{column.Field}` {column.Type} NULL")
+
+
+def move_rows(source, target, columns, names):
+    """Copy rows to `target` and delete them from `source` in one transaction.
+
+    Only `names` still in `source` are moved, and they are returned. A row
+    that already exists in `target` raises instead of being overwritten.
+    """
+    names = tuple(frappe.db.sql_list(
+        f"SELECT name FROM `{source}` WHERE name IN %s FOR UPDATE", (names,)
+    ))
+    if not names:
+        return ()
+
+    cols = ", ".join(f"`{column}`" for column in columns)
+    frappe.db.sql(f"""
+        INSERT INTO `{target}` ({cols})
+        SELECT {cols} FROM `{source}` WHERE name IN %s
+    """, (names,))
+    frappe.db.sql(f"DELETE FROM `{source}` WHERE name IN %s", (names,))
+    return names
+
+
+def archive_doctype(doctype, days=None, chunk_size=CHUNK_SIZE, throttle=THROTTLE):
+    """Move cold rows of one doctype into its archive table, a chunk per commit"""
+    rule = ARCHIVE_RULES[doctype]
+    days = cint(days) or cint(frappe.conf.get(rule["config_key"])) or rule["default_days"]
+    cutoff = add_days(nowdate(), -days)
+    columns = common_columns(doctype)
+    moved = 0
+    last_name = ""
+
+    while True:
+        names = frappe.db.sql_list(f"""
+            SELECT name FROM `tab{doctype}`
+            WHERE {rule["condition"]} AND name > %(after)s
+            ORDER BY name
+            LIMIT %(limit)s
+        """, {"cutoff": cutoff, "after": last_name, "limit": chunk_size})
+        if not names:
+            break
+
+        archived = move_rows(f"tab{doctype}", archive_table(doctype), columns, tuple(names))
+        # Archived rows leave the hot table, so incremental sync must drop them
+        record_tombstones(doctype, archived)
+        frappe.db.commit()
+        moved += len(archived)
+        last_name = names[-1]
+
+        if len(names) < chunk_size:
+            break
+        if throttle:
+            time.sleep(throttle)
+
+    return moved
+
+
+def archive_cold_records():
+    """Weekly scheduler entry point, skipped while a previous run is still moving rows"""
+    from gestion_tiempo.jobs import JobLocked, job_lock
+
+    try:
+        with job_lock("archive_cold_records", ttl=60 * 60 * 6):
+            result = {doctype: archive_doctype(doctype) for doctype in ARCHIVE_RULES}
+    except JobLocked:
+        return None
+
+    result["archived_on"] = str(now_datetime())
+    return result
+
+
+@frappe.whitelist()
+def restore_archived(doctype, names=None, customer=None):
+    """Move archived subscriptions or payments back to the hot table.
+
+    Restore specific `names` (a list or JSON list) or everything archived
+    for a `customer`. Archived subscriptions of restored payments are
+    restored with them.
+    """
+    frappe.only_for("System Manager")
+    if doctype not in ARCHIVE_RULES:
+        frappe.throw(_("Invalid doctype"))
+    if isinstance(names, str):
+        names = frappe.parse_json(names)
+
+    if customer:
+        names = frappe.db.sql_list(
+            f"SELECT name FROM `{archive_table(doctype)}` WHERE customer = %s", (customer,)
+        )
+    if not names:
+        return {"restored": 0}
+
+    restored = 0
+    if doctype == "Payment":
+        restored += restore_rows("Subscription", archived_subscriptions_of(names))
+    restored += restore_rows(doctype, names)
+
+    return {"restored": restored}
+
+
+def archived_subscriptions_of(payments):
+    """Archived subscriptions linked from archived `payments`"""
+    subscriptions = set()
+    for i in range(0, len(payments), CHUNK_SIZE):
+        subscriptions.update(frappe.db.sql_list(f"""
+            SELECT DISTINCT p.subscription
+            FROM `{archive_table("Payment")}` p
+            JOIN `{archive_table("Subscription")}` s ON s.name = p.subscription
+            WHERE p.name IN %s
+        """, (tuple(payments[i:i + CHUNK_SIZE]),)))
+    return sorted(subscriptions)
+
+
+def restore_rows(doctype, names):
+    """Move archived rows back to the hot table, a chunk per commit"""
+    columns = common_columns(doctype)
+    restored = 0
+    for i in range(0, len(names), CHUNK_SIZE):
+        chunk = move_rows(archive_table(doctype), f"tab{doctype}", columns, tuple(names[i:i + CHUNK_SIZE]))
+        if not chunk:
+            continue
+        # Restored rows count as changes for incremental sync
+        frappe.db.sql(f"UPDATE `tab{doctype}` SET modified = %s WHERE name IN %s", (now_datetime(), chunk))
+        drop_tombstones(doctype, chunk)
+        frappe.db.commit()
+        restored += len(chunk)
+
+    return restored
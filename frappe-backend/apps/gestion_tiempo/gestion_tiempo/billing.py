@@ -0,0 +1,407 @@
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import nowdate, now_datetime, getdate, get_datetime, cint, flt
+
+from gestion_tiempo.jobs import RUN_DOCTYPE
+from gestion_tiempo.realtime import add_delta
+from gestion_tiempo.utils import reserve_names
+
+
+JOB_NAME = "billing"
+BATCH_SIZE = 200
+LOCK_TTL = 10 * 60
+RUN_TTL = 60 * 60 * 24 * 7
+DEFAULT_SHARDS = 8
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class PaymentGateway:
+    """Interface for charging renewals.
+
+    Implementations must treat `idempotency_key` as the identity of the
+    charge: calling `charge` twice with the same key must not charge the
+    customer twice. Set `billing_gateway` in site config to the dotted path
+    of the class to use.
+    """
+
+    def charge(self, customer, amount, idempotency_key, description=""):
+        """Return a dict with `status` ("Completed" or "Failed") and `transaction_id`"""
+        raise NotImplementedError
+
+
+class FakeGateway(PaymentGateway):
+    """Local gateway for development and tests. Never talks to the network."""
+
+    def __init__(self, decline_customers=None):
+        self.decline_customers = set(decline_customers or [])
+        self.charges = {}
+
+    def charge(self, customer, amount, idempotency_key, description=""):
+        if idempotency_key not in self.charges:
+            status = "Failed" if customer in self.decline_customers else "Completed"
+            self.charges[idempotency_key] = {
+                "status": status,
+                "transaction_id": f"fake_{frappe.generate_hash(length=12)}",
+                "amount": flt(amount),
+            }
+        return self.charges[idempotency_key]
+
+
+def get_gateway():
+    """Instantiate the gateway configured in `billing_gateway`"""
+    path = frappe.conf.get("billing_gateway")
+    if not path:
+        frappe.throw(_("No billing gateway configured (set billing_gateway in site config)"))
+    return frappe.get_attr(path)()
+
+
+def run_billing():
+    """Daily scheduler entry point"""
+    if frappe.conf.get("billing_gateway"):
+        queue_billing_run()
+
+
+@frappe.whitelist()
+def start_billing_run(shards=None, billing_date=None):
+    """Start a billing run by hand. Charges every due customer, so admins only."""
+    frappe.only_for("System Manager")
+    return queue_billing_run(shards, billing_date)
+
+
+def queue_billing_run(shards=None, billing_date=None):
+    """Split due subscriptions into shards and bill them on parallel workers"""
+    shards = cint(shards) or cint(frappe.conf.get("billing_shards")) or DEFAULT_SHARDS
+    billing_date = str(getdate(billing_date or nowdate()))
+    # Fail early if the gateway is missing instead of in every shard
+    get_gateway()
+
+    run_id = f"{billing_date}-{frappe.generate_hash(length=8)}"
+    started = now_datetime()
+    cache = frappe.cache()
+    cache.set_value(f"billing_run:{run_id}", {
+        "billing_date": billing_date,
+        "shards": shards,
+        "started": str(started),
+        "finished": None
+    }, expires_in_sec=RUN_TTL)
+    cache.set_value("billing_run:last", run_id, expires_in_sec=RUN_TTL)
+
+    # Redis only holds the live counters; the run history is kept here
+    frappe.get_doc({
+        "doctype": RUN_DOCTYPE,
+        "job_name": JOB_NAME,
+        "run_key": run_id,
+        "status": "Running",
+        "started": started
+    }).insert(ignore_permissions=True)
+    frappe.db.commit()
+
+    for shard in range(shards):
+        frappe.enqueue(
+            "gestion_tiempo.billing.bill_shard",
+            queue="long",
+            timeout=60 * 60,
+            job_name=f"billing:{run_id}:{shard}",
+            run_id=run_id,
+            shard=shard,
+            shards=shards,
+            billing_date=billing_date
+        )
+
+    return {"run_id": run_id, "shards": shards, "billing_date": billing_date}
+
+
+def get_due_subscriptions(billing_date, shard, shards):
+    """Active paid subscriptions due on or before `billing_date` in one shard"""
+    return frappe.db.sql("""
+        SELECT
+            s.name, s.customer, s.billing_cycle, s.next_billing_date,
+            CASE
+                WHEN s.billing_cycle = 'Yearly' THEN sp.price_yearly
+                ELSE sp.price_monthly
+            END as amount
+        FROM `tabSubscription` s
+        JOIN `tabSubscription Plan` sp ON s.plan = sp.name
+        WHERE s.status = 'Active'
+        AND s.next_billing_date <= %s
+        AND CRC32(s.name) %% %s = %s
+        HAVING amount > 0
+        ORDER BY s.name
+    """, (billing_date, shards, shard), as_dict=True)
+
+
+def max_attempts():
+    return cint(frappe.conf.get("billing_max_attempts")) or DEFAULT_MAX_ATTEMPTS
+
+
+def bill_shard(run_id, shard, shards, billing_date):
+    """Charge every due subscription of one shard, writing in batches.
+
+    Each renewal is tried at most `billing_max_attempts` times, one attempt
+    per run with its own idempotency key. A subscription whose last attempt
+    is declined is expired instead of being charged again.
+    """
+    gateway = get_gateway()
+    subscriptions = get_due_subscriptions(billing_date, shard, shards)
+    totals = {"charged": 0, "failed": 0, "skipped": 0, "expired": 0, "amount": 0.0}
+    limit = max_attempts()
+
+    for i in range(0, len(subscriptions), BATCH_SIZE):
+        batch = subscriptions[i:i + BATCH_SIZE]
+        locked = [sub for sub in batch if acquire_lock(sub.name, run_id)]
+        totals["skipped"] += len(batch) - len(locked)
+
+        try:
+            attempts = get_attempts(locked, limit)
+
+            payments, expired = [], []
+            for sub in locked:
+                paid, failed = attempts[sub.name]
+                # The lock may have expired while earlier charges of the
+                # batch were running; never charge a subscription we lost
+                if paid or not extend_lock(sub.name, run_id):
+                    totals["skipped"] += 1
+                    continue
+                if failed >= limit:
+                    # Already out of attempts (e.g. the limit was lowered)
+                    expired.append(sub)
+                    continue
+
+                sub.attempt = failed + 1
+                sub.idempotency_key = attempt_key(sub, sub.attempt)
+                result = charge_subscription(gateway, sub)
+                payments.append((sub, result))
+                if result["status"] != "Completed" and sub.attempt >= limit:
+                    expired.append(sub)
+
+            renewed = write_batch(payments)
+            expire_subscriptions(expired)
+            frappe.db.commit()
+
+            completed = sum(result["status"] == "Completed" for _sub, result in payments)
+            totals["charged"] += len(renewed)
+            totals["amount"] += sum(flt(sub.amount) for sub in renewed)
+            totals["failed"] += len(payments) - completed
+            totals["expired"] += len(expired)
+            # Completed charges another run had already recorded
+            totals["skipped"] += completed - len(renewed)
+        finally:
+            for sub in locked:
+                release_lock(sub.name, run_id)
+
+    record_shard(run_id, totals)
+    return totals
+
+
+def attempt_key(sub, attempt):
+    """Idempotency key of one charge attempt for the current billing period"""
+    return f"{sub.name}:{sub.next_billing_date}:{attempt}"
+
+
+def get_attempts(subscriptions, limit):
+    """Map each subscription to (paid, failed attempts) for its current period"""
+    keys = [attempt_key(sub, n) for sub in subscriptions for n in range(1, limit + 1)]
+    attempts = {sub.name: (False, 0) for sub in subscriptions}
+    if not keys:
+        return attempts
+
+    for row in frappe.get_all(
+        "Payment",
+        filters={"idempotency_key": ["in", keys]},
+        fields=["subscription", "status"]
+    ):
+        paid, failed = attempts[row.subscription]
+        if row.status == "Completed":
+            paid = True
+        else:
+            failed += 1
+        attempts[row.subscription] = (paid, failed)
+    return attempts
+
+
+def charge_subscription(gateway, sub):
+    """Charge one renewal, turning gateway errors into a failed attempt"""
+    try:
+        result = gateway.charge(
+            sub.customer,
+            flt(sub.amount),
+            sub.idempotency_key,
+            description=f"Renewal {sub.name} ({sub.billing_cycle})"
+        )
+    except Exception:
+        frappe.log_error(title=f"Billing charge failed for {sub.name}")
+        result = {"status": "Failed", "transaction_id": ""}
+
+    if result.get("status") != "Completed":
+        result = {"status": "Failed", "transaction_id": result.get("transaction_id") or ""}
+    return result
+
+
+def write_batch(payments):
+    """Insert payments and roll renewed subscriptions forward in bulk.
+
+    Rows are written directly instead of through Payment.insert, whose
+    on_update hook would extend the subscription a second time. Every
+    attempt keeps its idempotency key, so a payment whose key is already
+    taken is dropped by the unique index; only subscriptions whose completed
+    payment was actually inserted are renewed, and they are returned.
+    """
+    if not payments:
+        return []
+
+    now = now_datetime()
+    user = frappe.session.user
+    names = reserve_names("PAY-.YYYY.-", len(payments))
+    fields = [
+        "name", "creation", "modified", "owner", "modified_by", "docstatus",
+        "customer", "subscription", "amount", "payment_date", "payment_method",
+        "status", "transaction_id", "idempotency_key", "naming_series"
+    ]
+    values = [
+        (
+            name, now, now, user, user, 0,
+            sub.customer, sub.name, flt(sub.amount), nowdate(), "Card",
+            result["status"], result["transaction_id"],
+            sub.idempotency_key,
+            "PAY-.YYYY.-.#####"
+        )
+        for name, (sub, result) in zip(names, payments)
+    ]
+    frappe.db.bulk_insert("Payment", fields, values, ignore_duplicates=True)
+
+    # Names were just reserved, so a completed one exists only if inserted
+    inserted = set(frappe.db.sql_list("""
+        SELECT name FROM `tabPayment`
+        WHERE name IN %s AND status = 'Completed'
+    """, (tuple(names),)))
+    renewed = [sub for name, (sub, _result) in zip(names, payments) if name in inserted]
+
+    if renewed:
+        frappe.db.sql("""
+            UPDATE `tabSubscription`
+            SET
+                next_billing_date = DATE_ADD(end_date, INTERVAL IF(billing_cycle = 'Yearly', 12, 1) MONTH),
+                end_date = DATE_ADD(end_date, INTERVAL IF(billing_cycle = 'Yearly', 12, 1) MONTH),
+                modified = %s
+            WHERE name IN %s
+        """, (now, tuple(sub.name for sub in renewed)))
+        # Payment hooks are skipped, so report the revenue to live dashboards
+        add_delta({"new_payments": len(renewed), "revenue": sum(flt(sub.amount) for sub in renewed)})
+
+    return renewed
+
+
+def expire_subscriptions(subscriptions):
+    """Expire subscriptions whose renewal ran out of attempts.
+
+    A completed payment recorded later reactivates them (see
+    Payment.update_subscription).
+    """
+    if not subscriptions:
+        return
+
+    frappe.db.sql("""
+        UPDATE `tabSubscription`
+        SET status = 'Expired', modified = %s
+        WHERE name IN %s AND status = 'Active'
+    """, (now_datetime(), tuple(sub.name for sub in subscriptions)))
+    add_delta({
+        "mrr": -sum(monthly_amount(sub) for sub in subscriptions),
+        "status:Active": -len(subscriptions),
+        "status:Expired": len(subscriptions)
+    })
+
+
+def monthly_amount(sub):
+    return flt(sub.amount) / 12 if sub.billing_cycle == "Yearly" else flt(sub.amount)
+
+
+def acquire_lock(subscription, run_id):
+    cache = frappe.cache()
+    return bool(cache.set(cache.make_key(f"billing_lock:{subscription}"), run_id, ex=LOCK_TTL, nx=True))
+
+
+def extend_lock(subscription, run_id):
+    """Renew the lock on a subscription if this run still holds it"""
+    cache = frappe.cache()
+    key = cache.make_key(f"billing_lock:{subscription}")
+    if frappe.safe_decode(cache.get(key) or b"") == run_id:
+        cache.expire(key, LOCK_TTL)
+        return True
+    return False
+
+
+def release_lock(subscription, run_id):
+    cache = frappe.cache()
+    key = cache.make_key(f"billing_lock:{subscription}")
+    if frappe.safe_decode(cache.get(key) or b"") == run_id:
+        cache.delete(key)
+
+
+def record_shard(run_id, totals):
+    """Add a shard's totals to the run and save the summary when it is the last one"""
+    cache = frappe.cache()
+    key = cache.make_key(f"billing_run_totals:{run_id}")
+    for field in ("charged", "failed", "skipped", "expired"):
+        cache.hincrby(key, field, totals[field])
+    cache.hincrbyfloat(key, "amount", totals["amount"])
+    cache.expire(key, RUN_TTL)
+
+    run = cache.get_value(f"billing_run:{run_id}") or {}
+    if cache.hincrby(key, "shards_done", 1) == cint(run.get("shards")):
+        finished = now_datetime()
+        run["finished"] = str(finished)
+        cache.set_value(f"billing_run:{run_id}", run, expires_in_sec=RUN_TTL)
+
+        summary = get_billing_run(run_id)
+        name = frappe.db.get_value(RUN_DOCTYPE, {"job_name": JOB_NAME, "run_key": run_id})
+        if name:
+            frappe.db.set_value(RUN_DOCTYPE, name, {
+                "status": "Completed",
+                "finished": finished,
+                "duration": (finished - get_datetime(run["started"])).total_seconds(),
+                "processed": summary["charged"] + summary["failed"],
+                "chunks": summary["shards_done"],
+                "summary": json.dumps(summary, indent=1)
+            })
+            frappe.db.commit()
+
+
+@frappe.whitelist()
+def get_billing_run(run_id=None):
+    """Get the summary of a billing run (the last one by default)"""
+    cache = frappe.cache()
+    run_id = run_id or cache.get_value("billing_run:last") or frappe.db.get_value(
+        RUN_DOCTYPE, {"job_name": JOB_NAME}, "run_key", order_by="creation desc"
+    )
+    if not run_id:
+        return None
+
+    run = cache.get_value(f"billing_run:{run_id}")
+    if not run:
+        # Live counters expire after RUN_TTL; finished runs keep their summary
+        summary = frappe.db.get_value(RUN_DOCTYPE, {"job_name": JOB_NAME, "run_key": run_id}, "summary")
+        if not summary:
+            frappe.throw(_("Billing run not found"))
+        return json.loads(summary)
+
+    fields = ["charged", "failed", "skipped", "expired", "amount", "shards_done"]
+    counts = dict(zip(fields, cache.hmget(cache.make_key(f"billing_run_totals:{run_id}"), fields)))
+    shards_done = cint(counts["shards_done"])
+
+    return {
+        "run_id": run_id,
+        "billing_date": run["billing_date"],
+        "started": run["started"],
+        "finished": run["finished"],
+        "shards": run["shards"],
+        "shards_done": shards_done,
+        "status": "Completed" if shards_done >= run["shards"] else "Running",
+        "charged": cint(counts["charged"]),
+        "failed": cint(counts["failed"]),
+        "skipped": cint(counts["skipped"]),
+        "expired": cint(counts["expired"]),
+        "amount": flt(counts["amount"], 2),
+    }
@@ -0,0 +1,160 @@
+import base64
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, add_to_date, cint, get_datetime, now_datetime
+
+
+# Fields returned for each synced doctype, in the order of the row arrays
+SYNC_FIELDS = {
+    "Customer": ["name", "modified", "full_name", "email", "phone", "company", "creation"],
+    "Subscription": ["name", "modified", "customer", "plan", "status", "billing_cycle", "start_date", "end_date", "next_billing_date"],
+    "Payment": ["name", "modified", "customer", "subscription", "amount", "payment_date", "payment_method", "status", "transaction_id"],
+    "Subscription Plan": ["name", "modified", "plan_name", "is_active", "price_monthly", "price_yearly", "max_habits", "max_goals"],
+}
+
+TOMBSTONES = "Sync Tombstone"
+MAX_LIMIT = 1000
+# Rows are only served once their `modified` is this old, so a transaction
+# that set `modified` before a later one committed is not skipped
+SETTLE_SECONDS = 60
+# Deletions older than this are pruned; older cursors must sync from scratch
+TOMBSTONE_DAYS = 90
+
+
+def encode_cursor(positions):
+    return base64.urlsafe_b64encode(json.dumps(positions, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return {}
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        frappe.throw(_("Invalid sync cursor"))
+
+
+def settle_seconds():
+    return cint(frappe.conf.get("sync_settle_seconds")) or SETTLE_SECONDS
+
+
+def tombstone_days():
+    return cint(frappe.conf.get("sync_tombstone_days")) or TOMBSTONE_DAYS
+
+
+def fetch_after(doctype, fields, position, limit, until, conditions="", values=()):
+    """Rows of `doctype` after a (modified, name) position and modified before `until`"""
+    modified, name = position or ("1900-01-01", "")
+    columns = ", ".join(f"`{field}`" for field in fields)
+
+    return frappe.db.sql(f"""
+        SELECT {columns}
+        FROM `tab{doctype}`
+        WHERE (modified > %s OR (modified = %s AND name > %s))
+        AND modified < %s
+        {conditions}
+        ORDER BY modified, name
+        LIMIT %s
+    """, (modified, modified, name, until, *values, limit))
+
+
+def record_tombstone(doc, method=None):
+    """on_trash hook: remember deletions so clients can drop them"""
+    frappe.get_doc({
+        "doctype": TOMBSTONES,
+        "ref_doctype": doc.doctype,
+        "ref_name": doc.name
+    }).insert(ignore_permissions=True)
+
+
+def record_tombstones(doctype, names):
+    """Tombstones for rows removed without on_trash, in one insert"""
+    now = now_datetime()
+    user = frappe.session.user
+    frappe.db.bulk_insert(
+        TOMBSTONES,
+        ["name", "creation", "modified", "owner", "modified_by", "docstatus", "ref_doctype", "ref_name"],
+        [(frappe.generate_hash(length=10), now, now, user, user, 0, doctype, name) for name in names]
+    )
+
+
+def drop_tombstones(doctype, names):
+    """Forget deletions of rows that came back"""
+    frappe.db.delete(TOMBSTONES, {"ref_doctype": doctype, "ref_name": ["in", list(names)]})
+
+
+def prune_tombstones():
+    """Daily scheduler entry point: drop deletions older than the retention"""
+    cutoff = add_days(now_datetime(), -tombstone_days())
+    frappe.db.delete(TOMBSTONES, {"modified": ["<", cutoff]})
+    frappe.db.commit()
+
+
+@frappe.whitelist()
+def changes_since(cursor=None, limit=500):
+    """Get incremental changes to customers, subscriptions, payments and plans.
+
+    Each doctype is returned as column names plus row arrays, with the
+    names deleted since the cursor under `deleted`. Pass the returned
+    `cursor` back on the next call; keep calling while `has_more` is set.
+
+    Changes are served once they are `SETTLE_SECONDS` old. A cursor older
+    than the tombstone retention is ignored and `reset` is set: the client
+    must drop its copy and apply the full snapshot that follows.
+
+    The feed covers every customer and payment, so admins only.
+    """
+    frappe.only_for("System Manager")
+    limit = min(max(cint(limit), 1), MAX_LIMIT)
+    positions = decode_cursor(cursor)
+    until = add_to_date(now_datetime(), seconds=-settle_seconds())
+    reset = False
+    if positions:
+        issued = positions.get("issued")
+        if not issued or get_datetime(issued) < add_days(now_datetime(), -tombstone_days()):
+            positions, reset = {}, True
+    has_more = False
+    changes = {}
+
+    for doctype, fields in SYNC_FIELDS.items():
+        rows = fetch_after(doctype, fields, positions.get(doctype), limit + 1, until)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            has_more = True
+        if rows:
+            positions[doctype] = [str(rows[-1][1]), rows[-1][0]]
+        changes[doctype] = {"fields": fields, "rows": [list(row) for row in rows], "deleted": []}
+
+    placeholders = ", ".join(["%s"] * len(SYNC_FIELDS))
+    tombstones = fetch_after(
+        TOMBSTONES,
+        ["name", "modified", "ref_doctype", "ref_name"],
+        positions.get(TOMBSTONES),
+        limit + 1,
+        until,
+        f"AND ref_doctype IN ({placeholders})",
+        tuple(SYNC_FIELDS)
+    )
+    if len(tombstones) > limit:
+        tombstones = tombstones[:limit]
+        has_more = True
+    if tombstones:
+        positions[TOMBSTONES] = [str(tombstones[-1][1]), tombstones[-1][0]]
+    for _name, _modified, ref_doctype, ref_name in tombstones:
+        changes[ref_doctype]["deleted"].append(ref_name)
+
+    positions["issued"] = str(until)
+    return {
+        "changes": changes,
+        "cursor": encode_cursor(positions),
+        "has_more": has_more,
+        "reset": reset,
+    }
+
+
+def setup_indexes():
+    """Composite indexes that back the (modified, name) cursor"""
+    for doctype in (*SYNC_FIELDS, TOMBSTONES):
+        frappe.db.add_index(doctype, ["modified", "name"], index_name="modified_name_index")
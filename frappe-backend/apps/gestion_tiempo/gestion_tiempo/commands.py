@@ -0,0 +1,32 @@
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("migrate-plan")
+@click.argument("from_plan")
+@click.argument("to_plan")
+@click.option("--status", default="Active", help="Only move subscriptions with this status")
+@click.option("--dry-run", is_flag=True, default=False, help="Only count matching subscriptions")
+@click.option("--chunk-size", default=1000, type=int, help="Subscriptions per transaction")
+@click.option("--throttle", default=0.1, type=float, help="Seconds to sleep between chunks")
+@click.option("--migration-id", default=None, help="Checkpoint id, reuse it to resume a run")
+@pass_context
+def migrate_plan(context, from_plan, to_plan, status, dry_run, chunk_size, throttle, migration_id):
+    """Move every subscription from FROM_PLAN to TO_PLAN"""
+    from gestion_tiempo.plan_migration import migrate_subscriptions
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        result = migrate_subscriptions(
+            from_plan, to_plan, status, dry_run, chunk_size, throttle, migration_id,
+            on_progress=lambda p: click.echo(f"Migrated {p['migrated']} (last: {p['last_name']})")
+        )
+        click.echo(result)
+    finally:
+        frappe.destroy()
+
+
+commands = [migrate_plan]
@@ -0,0 +1,39 @@
+import frappe
+
+
+ACTIVE_CUSTOMER_INDEX = "unique_active_customer"
+
+
+def setup_active_subscription_constraint():
+    """One active subscription per customer, enforced by the database.
+
+    `active_customer` is the customer while the subscription is Active and
+    NULL otherwise; a unique index on it allows any number of inactive
+    subscriptions but only one active one per customer, even under
+    concurrent inserts.
+    """
+    columns = frappe.db.sql_list("SHOW COLUMNS FROM `tabSubscription`")
+    if "active_customer" not in columns:
+        duplicates = frappe.db.sql_list("""
+            SELECT customer
+            FROM `tabSubscription`
+            WHERE status = 'Active'
+            GROUP BY customer
+            HAVING COUNT(*) > 1
+        """)
+        if duplicates:
+            frappe.throw(
+                "Cannot add the active subscription constraint, these customers have "
+                f"more than one active subscription: {', '.join(duplicates)}"
+            )
+
+        frappe.db.sql_ddl("""
+            ALTER TABLE `tabSubscription`
+            ADD COLUMN `active_customer` VARCHAR(140)
+                AS (IF(status = 'Active', customer, NULL)) PERSISTENT,
+            ADD UNIQUE INDEX `unique_active_customer` (`active_customer`)
+        """)
+
+
+def is_active_subscription_violation(exc):
+    return ACTIVE_CUSTOMER_INDEX in str(getattr(exc, "args", exc))
@@ -0,0 +1,79 @@
+import datetime
+import decimal
+import gzip
+
+import frappe
+import msgpack
+from frappe import _
+
+
+FORMATS = ("columns", "msgpack")
+MIN_COMPRESS_BYTES = 1024
+
+
+def to_columns(rows, columns=None):
+    """Turn a list of dicts into column names plus row arrays"""
+    if columns is None:
+        # Rows may not all carry the same optional keys
+        columns = list(dict.fromkeys(key for row in rows for key in row))
+    return {
+        "columns": columns,
+        "rows": [[row.get(column) for column in columns] for row in rows],
+    }
+
+
+def encode_default(value):
+    """Fallback for types msgpack does not know about"""
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time, datetime.timedelta)):
+        return str(value)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return str(value)
+
+
+def compress(body):
+    """Compress with the best encoding the client accepts"""
+    if len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+
+    accepted = frappe.get_request_header("Accept-Encoding") or ""
+    if "br" in accepted:
+        try:
+            import brotli
+            return brotli.compress(body, quality=5), "br"
+        except ImportError:
+            pass
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=6), "gzip"
+    return body, None
+
+
+def encode_response(payload, list_key=None, response_format=None):
+    """Apply an opt-in compact format to an endpoint payload.
+
+    `columns` replaces the list of dicts under `list_key` (or the whole
+    payload when it is a list) with column names plus row arrays.
+    `msgpack` does the same and returns the result as a compressed
+    msgpack body instead of JSON.
+    """
+    if not response_format:
+        return payload
+    if response_format not in FORMATS:
+        frappe.throw(_("Invalid response format"))
+
+    if list_key:
+        payload[list_key] = to_columns(payload[list_key])
+    else:
+        payload = to_columns(payload)
+
+    if response_format == "columns":
+        return payload
+
+    from werkzeug.wrappers import Response
+
+    body, content_encoding = compress(msgpack.packb(payload, default=encode_default, use_bin_type=True))
+    response = Response(body, content_type="application/msgpack")
+    if content_encoding:
+        response.headers["Content-Encoding"] = content_encoding
+        response.headers["Vary"] = "Accept-Encoding"
+    return response
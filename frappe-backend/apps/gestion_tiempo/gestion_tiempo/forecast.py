@@ -0,0 +1,129 @@
+import frappe
+import numpy as np
+from frappe.utils import nowdate, cint, flt
+
+from gestion_tiempo.analytics import month_index, month_label
+
+
+def load_active_subscriptions():
+    """Load active subscriptions grouped by cycle, billing and end month.
+
+    The grouping happens in SQL so only a few hundred rows come back even
+    with millions of subscriptions. `amount` is the summed price of one
+    billing cycle for the group.
+    """
+    rows = frappe.db.sql("""
+        SELECT
+            s.billing_cycle = 'Yearly' as is_yearly,
+            YEAR(COALESCE(s.next_billing_date, s.end_date)) * 12
+                + MONTH(COALESCE(s.next_billing_date, s.end_date)) - 1 as billing_month,
+            YEAR(s.end_date) * 12 + MONTH(s.end_date) - 1 as end_month,
+            COUNT(*) as subscriptions,
+            SUM(
+                CASE
+                    WHEN s.billing_cycle = 'Yearly' THEN COALESCE(sp.price_yearly, 0)
+                    ELSE COALESCE(sp.price_monthly, 0)
+                END
+            ) as amount
+        FROM `tabSubscription` s
+        JOIN `tabSubscription Plan` sp ON s.plan = sp.name
+        WHERE s.status = 'Active'
+        GROUP BY is_yearly, billing_month, end_month
+    """)
+
+    if not rows:
+        return {
+            "is_yearly": np.array([], dtype=bool),
+            "billing_month": np.array([], dtype=np.int32),
+            "end_month": np.array([], dtype=np.int32),
+            "subscriptions": np.array([], dtype=np.int64),
+            "amount": np.array([], dtype=np.float64),
+        }
+
+    is_yearly, billing_month, end_month, subscriptions, amount = zip(*rows)
+
+    return {
+        "is_yearly": np.array(is_yearly, dtype=bool),
+        # Subscriptions without dates never bill inside the horizon
+        "billing_month": np.array([-1 if m is None else m for m in billing_month], dtype=np.int32),
+        "end_month": np.array([-1 if m is None else m for m in end_month], dtype=np.int32),
+        "subscriptions": np.array(subscriptions, dtype=np.int64),
+        "amount": np.array(amount, dtype=np.float64),
+    }
+
+
+def project_revenue(subs, current_month, months=12, churn_rate=0):
+    """Project renewals, expirations, MRR and ARR per month.
+
+    `subs` holds one row per group of subscriptions as returned by
+    `load_active_subscriptions`. Monthly subscriptions renew every month
+    from their billing month, yearly ones every twelve months. Overdue
+    billing dates are treated as due this month.
+
+    `churn_rate` is a monthly churn percentage applied at renewals: a
+    group keeps `(1 - churn_rate)` of its subscriptions at each monthly
+    renewal and `(1 - churn_rate) ** 12` at each yearly one, so expected
+    revenue and MRR drop where the renewals fall instead of uniformly.
+    `mrr_at_risk` is the MRR of the subscriptions whose period ends in the
+    month.
+    """
+    month = np.arange(months)[None, :]
+    is_yearly = subs["is_yearly"][:, None]
+    # Months from now until each group's next renewal
+    offset = np.maximum(subs["billing_month"] - current_month, 0)[:, None]
+    unbilled = (subs["billing_month"] < 0)[:, None]
+    since = month - offset
+
+    started = (since >= 0) & ~unbilled
+    due = started & (~is_yearly | (since % 12 == 0))
+    # Renewal decisions taken up to each month, counted in months of churn
+    churn_months = np.where(is_yearly, 12 * (since // 12 + 1), since + 1)
+    churn_months = np.where(started, churn_months, 0)
+    retained = (1 - flt(churn_rate) / 100) ** churn_months
+
+    amount = subs["amount"][:, None]
+    count = subs["subscriptions"][:, None]
+    monthly_value = np.where(is_yearly, amount / 12, amount)
+
+    renewals = (count * due).sum(axis=0)
+    billed = (amount * due).sum(axis=0)
+    expected_revenue = (amount * due * retained).sum(axis=0)
+    expected_mrr = (monthly_value * retained).sum(axis=0)
+
+    end_offset = subs["end_month"] - current_month
+    in_horizon = (subs["end_month"] >= 0) & (end_offset >= 0) & (end_offset < months)
+    expirations = np.bincount(
+        end_offset[in_horizon], weights=subs["subscriptions"][in_horizon], minlength=months
+    )
+    mrr_at_risk = np.bincount(
+        end_offset[in_horizon], weights=monthly_value[in_horizon, 0], minlength=months
+    )
+
+    return [
+        {
+            "month": month_label(current_month + m),
+            "renewals": int(renewals[m]),
+            "expirations": int(expirations[m]),
+            "revenue": flt(billed[m], 2),
+            "expected_revenue": flt(expected_revenue[m], 2),
+            "mrr": flt(expected_mrr[m], 2),
+            "arr": flt(expected_mrr[m] * 12, 2),
+            "mrr_at_risk": flt(mrr_at_risk[m], 2),
+        }
+        for m in range(months)
+    ]
+
+
+@frappe.whitelist()
+def get_revenue_forecast(months=12, churn_rate=0):
+    """Get a monthly MRR/ARR forecast from the renewal schedule"""
+    months = min(max(cint(months), 1), 36)
+    churn_rate = min(max(flt(churn_rate), 0), 100)
+    subs = load_active_subscriptions()
+
+    return {
+        "generated_on": nowdate(),
+        "active_subscriptions": int(subs["subscriptions"].sum()),
+        "churn_rate": churn_rate,
+        "forecast": project_revenue(subs, month_index(nowdate()), months, churn_rate),
+    }
@@ -0,0 +1 @@
+# Report Snapshot Doctype
@@ -0,0 +1,9 @@
+import frappe
+from frappe.model.document import Document
+from frappe.utils import getdate
+
+
+class ReportSnapshot(Document):
+    def validate(self):
+        if getdate(self.period_end) < getdate(self.period_start):
+            frappe.throw("Period end cannot be before period start")
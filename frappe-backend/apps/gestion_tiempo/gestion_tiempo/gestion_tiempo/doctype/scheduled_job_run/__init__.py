@@ -0,0 +1 @@
+# Scheduled Job Run Doctype
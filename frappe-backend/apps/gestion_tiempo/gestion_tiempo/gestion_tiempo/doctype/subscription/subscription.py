@@ -3,33 +3,44 @@ from frappe.model.document import Document
 from frappe.utils import nowdate, getdate
 
 
+class ActiveSubscriptionError(frappe.ValidationError):
+    pass
+
+
 class Subscription(Document):
     def validate(self):
         self.validate_dates()
-        self.check_active_subscription()
 
     def validate_dates(self):
         if self.start_date and self.end_date:
             if getdate(self.end_date) < getdate(self.start_date):
                 frappe.throw("End date cannot be before start date")
 
-    def check_active_subscription(self):
-        """Ensure customer doesn't have multiple active subscriptions"""
-        if self.status == "Active":
-            existing = frappe.db.get_value(
-                "Subscription",
-                {
-                    "customer": self.customer,
-                    "status": "Active",
-                    "name": ["!=", self.name]
-                },
-                "name"
-            )
-            if existing:
-                frappe.throw(
-                    f"Customer already has an active subscription: {existing}. "
-                    "Please cancel or pause the existing subscription first."
-                )
+    def show_unique_validation_message(self, e):
+        """Ensure customer doesn't have multiple active subscriptions.
+
+        Enforced by the unique index on `active_customer`; the violation is
+        reported here instead of with a lookup on every save.
+        """
+        from gestion_tiempo.constraints import is_active_subscription_violation
+
+        if not is_active_subscription_violation(e):
+            return super().show_unique_validation_message(e)
+
+        existing = frappe.db.get_value(
+            "Subscription",
+            {
+                "customer": self.customer,
+                "status": "Active",
+                "name": ["!=", self.name]
+            },
+            "name"
+        )
+        frappe.throw(
+            f"Customer already has an active subscription: {existing}. "
+            "Please cancel or pause the existing subscription first.",
+            ActiveSubscriptionError
+        )
 
     def before_save(self):
         # Auto-expire if end_date has passed
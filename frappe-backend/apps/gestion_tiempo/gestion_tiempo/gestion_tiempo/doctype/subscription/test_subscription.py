@@ -0,0 +1,105 @@
+import threading
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import nowdate, add_months
+
+from gestion_tiempo.gestion_tiempo.doctype.subscription.subscription import ActiveSubscriptionError
+
+
+TEST_PLAN = "_Test Concurrency Plan"
+TEST_EMAIL = "_test_concurrency@example.com"
+
+
+def make_subscription(customer, status="Active"):
+    return frappe.get_doc({
+        "doctype": "Subscription",
+        "customer": customer,
+        "plan": TEST_PLAN,
+        "status": status,
+        "billing_cycle": "Monthly",
+        "start_date": nowdate(),
+        "end_date": add_months(nowdate(), 1),
+        "next_billing_date": add_months(nowdate(), 1)
+    })
+
+
+class TestSubscription(FrappeTestCase):
+    def setUp(self):
+        if not frappe.db.exists("Subscription Plan", TEST_PLAN):
+            frappe.get_doc({
+                "doctype": "Subscription Plan",
+                "plan_name": TEST_PLAN,
+                "price_monthly": 100,
+                "price_yearly": 1000
+            }).insert()
+
+        self.customer = frappe.db.get_value("Customer", {"email": TEST_EMAIL}, "name")
+        if not self.customer:
+            self.customer = frappe.get_doc({
+                "doctype": "Customer",
+                "full_name": "Test Concurrency",
+                "email": TEST_EMAIL
+            }).insert().name
+
+        # Start without active subscriptions (after_insert may add a Free one)
+        frappe.db.sql("DELETE FROM `tabSubscription` WHERE customer = %s", (self.customer,))
+        frappe.db.commit()
+
+    def tearDown(self):
+        frappe.db.rollback()
+        frappe.db.sql("DELETE FROM `tabSubscription` WHERE customer = %s", (self.customer,))
+        frappe.db.commit()
+
+    def test_second_active_subscription_is_rejected(self):
+        make_subscription(self.customer).insert()
+
+        self.assertRaises(ActiveSubscriptionError, make_subscription(self.customer).insert)
+
+    def test_inactive_subscriptions_are_not_limited(self):
+        make_subscription(self.customer).insert()
+        make_subscription(self.customer, "Cancelled").insert()
+        make_subscription(self.customer, "Cancelled").insert()
+
+        self.assertEqual(frappe.db.count("Subscription", {"customer": self.customer}), 3)
+
+    def test_reactivating_a_subscription_is_rejected(self):
+        make_subscription(self.customer).insert()
+        cancelled = make_subscription(self.customer, "Cancelled").insert()
+
+        cancelled.status = "Active"
+        self.assertRaises(ActiveSubscriptionError, cancelled.save)
+
+    def test_concurrent_inserts_keep_one_active_subscription(self):
+        site = frappe.local.site
+        workers = 8
+        barrier = threading.Barrier(workers)
+        results = []
+
+        def insert():
+            frappe.init(site=site)
+            frappe.connect()
+            frappe.set_user("Administrator")
+            try:
+                barrier.wait()
+                make_subscription(self.customer).insert()
+                frappe.db.commit()
+                results.append("inserted")
+            except ActiveSubscriptionError:
+                frappe.db.rollback()
+                results.append("rejected")
+            finally:
+                frappe.destroy()
+
+        threads = [threading.Thread(target=insert) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count("inserted"), 1)
+        self.assertEqual(results.count("rejected"), workers - 1)
+        self.assertEqual(
+            frappe.db.count("Subscription", {"customer": self.customer, "status": "Active"}),
+            1
+        )
@@ -0,0 +1 @@
+# Sync Tombstone Doctype
@@ -38,7 +38,8 @@ app_version = "0.0.1"
 # ------------
 
 # before_install = "gestion_tiempo.install.before_install"
-# after_install = "gestion_tiempo.install.after_install"
+after_install = "gestion_tiempo.install.after_install"
+after_migrate = "gestion_tiempo.install.after_migrate"
 
 # Desk Notifications
 # ------------------
@@ -78,15 +79,45 @@ app_version = "0.0.1"
 #	}
 # }
 
+doc_events = {
+    "Customer": {
+        "on_trash": "gestion_tiempo.changes.record_tombstone"
+    },
+    "Subscription": {
+        "on_update": "gestion_tiempo.realtime.on_subscription_update",
+        "on_trash": [
+            "gestion_tiempo.changes.record_tombstone",
+            "gestion_tiempo.realtime.on_subscription_trash"
+        ]
+    },
+    "Payment": {
+        "on_update": "gestion_tiempo.realtime.on_payment_update",
+        "on_trash": "gestion_tiempo.changes.record_tombstone"
+    },
+    "Subscription Plan": {
+        "on_trash": "gestion_tiempo.changes.record_tombstone"
+    }
+}
+
 # Scheduled Tasks
 # ---------------
 
 scheduler_events = {
+    "all": [
+        "gestion_tiempo.realtime.flush_stale_deltas"
+    ],
+    "hourly": [
+        "gestion_tiempo.jobs.retry_unfinished_runs"
+    ],
     "daily": [
-        "gestion_tiempo.tasks.check_expiring_subscriptions"
+        "gestion_tiempo.tasks.check_expiring_subscriptions",
+        "gestion_tiempo.billing.run_billing",
+        "gestion_tiempo.reports.update_report_snapshots",
+        "gestion_tiempo.changes.prune_tombstones"
     ],
     "weekly": [
-        "gestion_tiempo.tasks.generate_weekly_report"
+        "gestion_tiempo.tasks.generate_weekly_report",
+        "gestion_tiempo.archive.archive_cold_records"
     ]
 }
 
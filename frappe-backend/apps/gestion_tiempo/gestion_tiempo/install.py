@@ -0,0 +1,13 @@
+def after_install():
+    after_migrate()
+
+
+def after_migrate():
+    """Database objects that DocType JSON cannot describe"""
+    from gestion_tiempo import archive, changes, constraints, reports, search
+
+    constraints.setup_active_subscription_constraint()
+    changes.setup_indexes()
+    search.setup_indexes()
+    reports.setup_indexes()
+    archive.setup_archive_tables()
@@ -0,0 +1,213 @@
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import now_datetime, cint
+
+
+RUN_DOCTYPE = "Scheduled Job Run"
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_LOCK_TTL = 15 * 60
+# Jobs re-run by retry_unfinished_runs, with their scheduler entry points
+RETRY_JOBS = {
+    "check_expiring_subscriptions": "gestion_tiempo.tasks.check_expiring_subscriptions",
+    "update_report_snapshots": "gestion_tiempo.reports.update_report_snapshots",
+    "generate_weekly_report": "gestion_tiempo.tasks.generate_weekly_report",
+}
+MAX_RETRY_ATTEMPTS = 5
+
+
+class JobLocked(Exception):
+    """Another run of the same job holds the lock"""
+
+
+def lock_key(job_name):
+    return frappe.cache().make_key(f"job_lock:{job_name}")
+
+
+def acquire_lock(job_name, token, ttl=DEFAULT_LOCK_TTL):
+    return bool(frappe.cache().set(lock_key(job_name), token, ex=ttl, nx=True))
+
+
+def extend_lock(job_name, token, ttl=DEFAULT_LOCK_TTL):
+    """Push the lock expiry forward while this run still owns it"""
+    cache = frappe.cache()
+    key = lock_key(job_name)
+    if frappe.safe_decode(cache.get(key) or b"") == token:
+        cache.expire(key, ttl)
+        return True
+    return False
+
+
+def release_lock(job_name, token):
+    cache = frappe.cache()
+    key = lock_key(job_name)
+    if frappe.safe_decode(cache.get(key) or b"") == token:
+        cache.delete(key)
+
+
+def wait_for_lock(job_name, timeout=4 * 60, interval=5):
+    """Wait until no run of `job_name` holds its lock; False on timeout"""
+    deadline = time.monotonic() + timeout
+    while frappe.cache().get(lock_key(job_name)):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+    return True
+
+
+@contextmanager
+def job_lock(job_name, ttl=DEFAULT_LOCK_TTL):
+    """Hold the distributed lock of a job, raising JobLocked if it is taken"""
+    token = frappe.generate_hash(length=12)
+    if not acquire_lock(job_name, token, ttl):
+        raise JobLocked(job_name)
+    try:
+        yield token
+    finally:
+        release_lock(job_name, token)
+
+
+def get_resumable_run(job_name, run_key):
+    """The last unfinished run with the same key, if any.
+
+    A run left as Running can only be resumed once its lock has expired,
+    which is the case whenever the caller holds the lock.
+    """
+    return frappe.db.get_value(
+        RUN_DOCTYPE,
+        {"job_name": job_name, "run_key": run_key or "", "status": ["in", ["Running", "Failed"]]},
+        ["name", "checkpoint", "processed", "chunks", "attempts"],
+        as_dict=True,
+        order_by="creation desc"
+    )
+
+
+def start_run(job_name, run_key):
+    run = get_resumable_run(job_name, run_key)
+    if run:
+        frappe.db.set_value(RUN_DOCTYPE, run.name, {
+            "status": "Running",
+            "attempts": cint(run.attempts) + 1,
+            "error": None
+        })
+        return run
+
+    doc = frappe.get_doc({
+        "doctype": RUN_DOCTYPE,
+        "job_name": job_name,
+        "run_key": run_key or "",
+        "status": "Running",
+        "started": now_datetime(),
+        "checkpoint": "",
+        "processed": 0,
+        "chunks": 0,
+        "attempts": 1
+    }).insert(ignore_permissions=True)
+    return frappe._dict(name=doc.name, checkpoint="", processed=0, chunks=0, attempts=1)
+
+
+def finish_run(run, status, started_at, error=None):
+    frappe.db.set_value(RUN_DOCTYPE, run.name, {
+        "status": status,
+        "finished": now_datetime(),
+        "duration": time.monotonic() - started_at,
+        "checkpoint": run.checkpoint,
+        "processed": run.processed,
+        "chunks": run.chunks,
+        "error": error
+    })
+    frappe.db.commit()
+
+
+def run_job(job_name, fetch_chunk, process_chunk, run_key=None, checkpoint_of=None,
+            chunk_size=DEFAULT_CHUNK_SIZE, lock_ttl=DEFAULT_LOCK_TTL, on_complete=None):
+    """Run a scheduled job in committed chunks under a distributed lock.
+
+    `fetch_chunk(after, limit)` returns the next items after the checkpoint
+    `after` (an empty string on the first chunk); `process_chunk(items)`
+    handles them. The checkpoint, taken from the last item of each chunk
+    with `checkpoint_of` (default `str`), is committed together with the
+    chunk's writes, so a failed run with the same `run_key` resumes after
+    the last committed chunk. Runs that find the lock taken are skipped,
+    and so are keys that already have a completed run. The lock is renewed
+    before every commit; a run that lost it rolls its chunk back and raises
+    JobLocked.
+
+    Returns the Scheduled Job Run name, or None when skipped.
+    """
+    checkpoint_of = checkpoint_of or str
+    token = frappe.generate_hash(length=12)
+    if not acquire_lock(job_name, token, lock_ttl):
+        frappe.logger("gestion_tiempo.jobs").info(f"{job_name} is already running, skipping")
+        return None
+
+    started_at = time.monotonic()
+    run = None
+    try:
+        completed = frappe.db.exists(
+            RUN_DOCTYPE, {"job_name": job_name, "run_key": run_key or "", "status": "Completed"}
+        )
+        if run_key and completed:
+            # Already done for this key (e.g. the scheduler fired twice)
+            return completed
+
+        run = start_run(job_name, run_key)
+        frappe.db.commit()
+
+        while True:
+            items = fetch_chunk(run.checkpoint or "", chunk_size)
+            if not items:
+                break
+
+            process_chunk(items)
+            progress = {
+                "checkpoint": checkpoint_of(items[-1]),
+                "processed": cint(run.processed) + len(items),
+                "chunks": cint(run.chunks) + 1
+            }
+            frappe.db.set_value(RUN_DOCTYPE, run.name, progress, update_modified=False)
+            # Fence the commit: once the lock has expired another run may have
+            # resumed this same row, so the chunk must not be committed twice
+            if not extend_lock(job_name, token, lock_ttl):
+                raise JobLocked(f"{job_name} lost its lock")
+            frappe.db.commit()
+            run.update(progress)
+
+            if len(items) < chunk_size:
+                break
+
+        if on_complete:
+            on_complete()
+        finish_run(run, "Completed", started_at)
+        return run.name
+    except JobLocked:
+        # Drop the uncommitted chunk and leave the run to whoever holds the lock
+        frappe.db.rollback()
+        raise
+    except Exception:
+        frappe.db.rollback()
+        if run:
+            finish_run(run, "Failed", started_at, frappe.get_traceback())
+        raise
+    finally:
+        release_lock(job_name, token)
+
+
+def retry_unfinished_runs():
+    """Hourly scheduler entry point: re-run jobs whose last run failed or died.
+
+    The entry point is called again with its current run key, so a run of
+    the same key resumes from its checkpoint. Runs that already used
+    MAX_RETRY_ATTEMPTS attempts are left for someone to look at.
+    """
+    for job_name, method in RETRY_JOBS.items():
+        last = frappe.db.get_value(
+            RUN_DOCTYPE, {"job_name": job_name}, ["status", "attempts"], as_dict=True, order_by="creation desc"
+        )
+        if not last or last.status == "Completed" or cint(last.attempts) >= MAX_RETRY_ATTEMPTS:
+            continue
+        # A Running run whose lock is still held is just running
+        if frappe.cache().get(lock_key(job_name)):
+            continue
+        frappe.enqueue(method, queue="long", job_name=f"retry:{job_name}")
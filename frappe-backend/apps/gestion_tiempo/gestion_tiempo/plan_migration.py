@@ -0,0 +1,173 @@
+import time
+from collections import Counter
+
+import frappe
+from frappe import _
+from frappe.utils import now_datetime, cint, flt
+
+from gestion_tiempo.realtime import add_delta, monthly_value
+from gestion_tiempo.utils import bulk_insert_usage_logs
+
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_THROTTLE = 0.1
+PROGRESS_TTL = 60 * 60 * 24 * 7
+
+
+def validate_plans(from_plan, to_plan):
+    plans = dict(frappe.get_all(
+        "Subscription Plan",
+        filters={"name": ["in", [from_plan, to_plan]]},
+        fields=["name", "is_active"],
+        as_list=True
+    ))
+    if from_plan not in plans:
+        frappe.throw(_("Subscription plan not found: {0}").format(from_plan))
+    if to_plan not in plans:
+        frappe.throw(_("Subscription plan not found: {0}").format(to_plan))
+    if from_plan == to_plan:
+        frappe.throw(_("Source and target plans must be different"))
+    if not plans[to_plan]:
+        frappe.throw(_("Subscription plan {0} is not active").format(to_plan))
+
+
+def mrr_change(subscriptions, from_plan, to_plan, status):
+    """MRR difference of moving `subscriptions` between plans"""
+    cycles = Counter(sub.billing_cycle for sub in subscriptions)
+    return sum(
+        count * (monthly_value(to_plan, cycle, status) - monthly_value(from_plan, cycle, status))
+        for cycle, count in cycles.items()
+    )
+
+
+def get_chunk(from_plan, status, after, chunk_size):
+    """Next chunk of matching subscriptions in name order"""
+    return frappe.db.sql("""
+        SELECT name, customer
+        FROM `tabSubscription`
+        WHERE plan = %s AND status = %s AND name > %s
+        ORDER BY name
+        LIMIT %s
+    """, (from_plan, status, after, chunk_size), as_dict=True)
+
+
+def migrate_subscriptions(from_plan, to_plan, status="Active", dry_run=False,
+                          chunk_size=DEFAULT_CHUNK_SIZE, throttle=DEFAULT_THROTTLE,
+                          migration_id=None, on_progress=None):
+    """Move subscriptions from one plan to another in chunked transactions.
+
+    Every chunk is one UPDATE plus one bulk Usage Log insert, committed
+    before the next chunk starts. Progress is checkpointed in the cache
+    under `migration_id`, so a run started again with the same id resumes
+    after the last committed subscription. `throttle` seconds are slept
+    between chunks to leave room for production writes.
+    """
+    validate_plans(from_plan, to_plan)
+    chunk_size = max(cint(chunk_size), 1)
+
+    if dry_run:
+        matching = frappe.db.count("Subscription", filters={"plan": from_plan, "status": status})
+        return {
+            "dry_run": True,
+            "from_plan": from_plan,
+            "to_plan": to_plan,
+            "status": status,
+            "matching": matching,
+            "chunks": -(-matching // chunk_size),
+        }
+
+    migration_id = migration_id or f"{from_plan}:{to_plan}:{status}"
+    cache_key = f"plan_migration:{migration_id}"
+    progress = frappe.cache().get_value(cache_key)
+    if not progress or progress.get("finished"):
+        # Only unfinished runs are resumed
+        progress = {
+            "migration_id": migration_id,
+            "from_plan": from_plan,
+            "to_plan": to_plan,
+            "status": status,
+            "migrated": 0,
+            "last_name": "",
+            "started": str(now_datetime()),
+            "finished": None,
+        }
+    details = f"Changed from {from_plan} to {to_plan}"
+
+    while True:
+        chunk = get_chunk(from_plan, status, progress["last_name"], chunk_size)
+        if not chunk:
+            break
+
+        # Lock the rows still on the source plan so exactly those are
+        # updated and logged, even if some changed since the chunk was read
+        locked = frappe.db.sql("""
+            SELECT name, customer, billing_cycle
+            FROM `tabSubscription`
+            WHERE name IN %s AND plan = %s AND status = %s
+            FOR UPDATE
+        """, (tuple(sub.name for sub in chunk), from_plan, status), as_dict=True)
+        if locked:
+            frappe.db.sql("""
+                UPDATE `tabSubscription`
+                SET plan = %s, modified = %s, modified_by = %s
+                WHERE name IN %s
+            """, (to_plan, now_datetime(), frappe.session.user, tuple(sub.name for sub in locked)))
+            bulk_insert_usage_logs([(sub.customer, "plan_change", details) for sub in locked])
+            add_delta({"mrr": mrr_change(locked, from_plan, to_plan, status)})
+        frappe.db.commit()
+
+        progress["migrated"] += len(locked)
+        progress["last_name"] = chunk[-1].name
+        frappe.cache().set_value(cache_key, progress, expires_in_sec=PROGRESS_TTL)
+        if on_progress:
+            on_progress(progress)
+
+        if len(chunk) < chunk_size:
+            break
+        if throttle:
+            time.sleep(flt(throttle))
+
+    progress["finished"] = str(now_datetime())
+    frappe.cache().set_value(cache_key, progress, expires_in_sec=PROGRESS_TTL)
+    return progress
+
+
+@frappe.whitelist()
+def bulk_migrate_plan(from_plan, to_plan, status="Active", dry_run=1,
+                      chunk_size=DEFAULT_CHUNK_SIZE, throttle=DEFAULT_THROTTLE, migration_id=None):
+    """Move all subscriptions on one plan to another.
+
+    Dry runs are answered inline; real migrations run on the long queue
+    and can be followed with `get_migration_progress`. Subscriptions are
+    written directly, without document permission checks, so only System
+    Managers may call it.
+    """
+    frappe.only_for("System Manager")
+    if cint(dry_run):
+        return migrate_subscriptions(from_plan, to_plan, status, True, chunk_size)
+
+    validate_plans(from_plan, to_plan)
+    migration_id = migration_id or f"{from_plan}:{to_plan}:{status}"
+    frappe.enqueue(
+        "gestion_tiempo.plan_migration.migrate_subscriptions",
+        queue="long",
+        timeout=60 * 60 * 4,
+        job_name=f"plan_migration:{migration_id}",
+        from_plan=from_plan,
+        to_plan=to_plan,
+        status=status,
+        chunk_size=cint(chunk_size),
+        throttle=flt(throttle),
+        migration_id=migration_id
+    )
+
+    return {"status": "queued", "migration_id": migration_id}
+
+
+@frappe.whitelist()
+def get_migration_progress(migration_id):
+    """Get the checkpoint of a plan migration"""
+    progress = frappe.cache().get_value(f"plan_migration:{migration_id}")
+    if not progress:
+        frappe.throw(_("Plan migration not found"))
+    return progress
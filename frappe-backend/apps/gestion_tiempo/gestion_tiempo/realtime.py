@@ -0,0 +1,165 @@
+import time
+from functools import partial
+
+import frappe
+from frappe.utils import flt, cint
+
+
+EVENT = "dashboard_delta"
+# Backoffice clients join the Subscription doctype room (permission checked by socket.io)
+ROOM_DOCTYPE = "Subscription"
+DEBOUNCE_SECONDS = 2
+WINDOW_TTL = 60
+STATUSES = ("Active", "Paused", "Cancelled", "Expired")
+FIELDS = ["mrr", "new_subscriptions", "new_payments", "revenue"] + [f"status:{s}" for s in STATUSES]
+
+
+def pending_key():
+    return frappe.cache().make_key("dashboard_delta:pending")
+
+
+def window_key():
+    return frappe.cache().make_key("dashboard_delta:window_started")
+
+
+def monthly_value(plan, billing_cycle, status):
+    """MRR contribution of one subscription"""
+    if status != "Active" or not plan:
+        return 0
+    price_monthly, price_yearly = frappe.get_cached_value(
+        "Subscription Plan", plan, ["price_monthly", "price_yearly"]
+    ) or (0, 0)
+    return flt(price_yearly) / 12 if billing_cycle == "Yearly" else flt(price_monthly)
+
+
+def on_subscription_update(doc, method=None):
+    old = doc.get_doc_before_save()
+    old_status = old.status if old else None
+    old_mrr = monthly_value(old.plan, old.billing_cycle, old.status) if old else 0
+    new_mrr = monthly_value(doc.plan, doc.billing_cycle, doc.status)
+
+    delta = {}
+    if new_mrr != old_mrr:
+        delta["mrr"] = new_mrr - old_mrr
+    if old_status != doc.status:
+        if old_status:
+            delta[f"status:{old_status}"] = -1
+        delta[f"status:{doc.status}"] = 1
+    if not old:
+        delta["new_subscriptions"] = 1
+
+    add_delta(delta)
+
+
+def on_subscription_trash(doc, method=None):
+    add_delta({
+        "mrr": -monthly_value(doc.plan, doc.billing_cycle, doc.status),
+        f"status:{doc.status}": -1
+    })
+
+
+def on_payment_update(doc, method=None):
+    old = doc.get_doc_before_save()
+    was_completed = old and old.status == "Completed"
+
+    if doc.status == "Completed" and not was_completed:
+        add_delta({"new_payments": 1, "revenue": flt(doc.amount)})
+    elif was_completed and doc.status != "Completed":
+        add_delta({"revenue": -flt(old.amount)})
+
+
+def add_delta(delta):
+    """Accumulate a delta once the current transaction commits.
+
+    Rolled back writes never reach the dashboard. Bulk writers that skip
+    the document hooks call this with their aggregated totals.
+    """
+    delta = {k: v for k, v in delta.items() if v and k in FIELDS}
+    if delta:
+        frappe.db.after_commit.add(partial(accumulate, delta))
+
+
+def accumulate(delta):
+    """Add a committed delta to the pending totals, flushing at once if no window is open"""
+    cache = frappe.cache()
+    key = pending_key()
+    pipe = cache.pipeline()
+    for field, value in delta.items():
+        if isinstance(value, int):
+            pipe.hincrby(key, field, value)
+        else:
+            pipe.hincrbyfloat(key, field, value)
+    pipe.execute()
+
+    if open_window():
+        # Leading edge: publish right away; deltas committed while the
+        # window is open are batched into the flushes that follow
+        frappe.enqueue("gestion_tiempo.realtime.flush_window", queue="short")
+
+
+def open_window():
+    """Start a debounce window; False if one is already open"""
+    return bool(frappe.cache().set(window_key(), time.time(), ex=WINDOW_TTL, nx=True))
+
+
+def flush_window():
+    """Publish pending deltas at most once every DEBOUNCE_SECONDS until they stop.
+
+    The window stays open while there is something to publish and is
+    closed after the first empty flush.
+    """
+    cache = frappe.cache()
+    while True:
+        if flush_deltas():
+            # Keep the window alive for as long as deltas keep coming
+            cache.expire(window_key(), WINDOW_TTL)
+            time.sleep(DEBOUNCE_SECONDS)
+            continue
+
+        cache.delete(window_key())
+        # Deltas committed between the empty flush and the delete found the
+        # window still open; publish them unless a new window took over
+        if not flush_deltas() or not open_window():
+            return
+        time.sleep(DEBOUNCE_SECONDS)
+
+
+def flush_stale_deltas():
+    """Scheduler safety net: publish deltas left pending by a flush job that died.
+
+    A window whose job died expires after WINDOW_TTL.
+    """
+    if open_window():
+        flush_window()
+
+
+def flush_deltas():
+    """Publish everything accumulated so far as one message"""
+    cache = frappe.cache()
+    key = pending_key()
+
+    batch_key = f"{key}:{frappe.generate_hash(length=8)}"
+    try:
+        cache.rename(key, batch_key)
+    except Exception:
+        # Nothing pending
+        return
+
+    values = dict(zip(FIELDS, cache.hmget(batch_key, FIELDS)))
+    cache.delete(batch_key)
+
+    message = {
+        "mrr": flt(values["mrr"], 2),
+        "new_subscriptions": cint(values["new_subscriptions"]),
+        "new_payments": cint(values["new_payments"]),
+        "revenue": flt(values["revenue"], 2),
+        "status_changes": {
+            status: cint(values[f"status:{status}"])
+            for status in STATUSES
+            if cint(values[f"status:{status}"])
+        },
+    }
+    message["active_subscriptions"] = message["status_changes"].get("Active", 0)
+
+    frappe.publish_realtime(EVENT, message, doctype=ROOM_DOCTYPE)
+    return message
@@ -0,0 +1,149 @@
+import frappe
+from frappe import _
+from frappe.utils import add_days, getdate, get_last_day, nowdate, flt, cint
+
+
+SNAPSHOT = "Report Snapshot"
+METRICS = ["new_customers", "new_subscriptions", "cancelled_subscriptions", "revenue", "payment_count"]
+PERIOD_TYPES = ("Daily", "Weekly", "Monthly")
+# How far back a missed daily run is recovered
+MAX_BACKFILL_DAYS = 31
+
+
+def week_bounds(day):
+    start = add_days(day, -getdate(day).weekday())
+    return getdate(start), getdate(add_days(start, 6))
+
+
+def month_bounds(day):
+    start = getdate(day).replace(day=1)
+    return start, getdate(get_last_day(start))
+
+
+def count_created(doctype, day):
+    """Rows of `doctype` created on `day`, as a half-open range on the indexed Datetime column"""
+    return cint(frappe.db.sql(f"""
+        SELECT COUNT(*) FROM `tab{doctype}`
+        WHERE creation >= %s AND creation < %s
+    """, (day, add_days(day, 1)))[0][0])
+
+
+def compute_day(day):
+    """Metrics for a single day, read from the raw tables through date indexes"""
+    day = getdate(day)
+
+    revenue = frappe.db.sql("""
+        SELECT COALESCE(SUM(amount), 0) as total, COUNT(*) as count
+        FROM `tabPayment`
+        WHERE status = 'Completed'
+        AND payment_date = %s
+    """, (day,), as_dict=True)[0]
+
+    return {
+        "new_customers": count_created("Customer", day),
+        "new_subscriptions": count_created("Subscription", day),
+        "cancelled_subscriptions": frappe.db.count(
+            "Subscription", filters={"status": "Cancelled", "cancellation_date": day}
+        ),
+        "revenue": flt(revenue.total),
+        "payment_count": cint(revenue.count),
+    }
+
+
+def rollup(start, end):
+    """Sum daily snapshots between two dates, without touching raw data"""
+    totals = frappe.db.sql(f"""
+        SELECT {", ".join(f"COALESCE(SUM({m}), 0) as {m}" for m in METRICS)}
+        FROM `tabReport Snapshot`
+        WHERE period_type = 'Daily'
+        AND period_start BETWEEN %s AND %s
+    """, (start, end), as_dict=True)[0]
+    return {m: flt(totals[m]) if m == "revenue" else cint(totals[m]) for m in METRICS}
+
+
+def missing_daily_snapshots(start, end):
+    """Days between two dates that have no daily snapshot yet"""
+    days = {getdate(add_days(start, i)) for i in range((getdate(end) - getdate(start)).days + 1)}
+    saved = frappe.get_all(
+        SNAPSHOT,
+        filters={"period_type": "Daily", "period_start": ["between", [start, end]]},
+        pluck="period_start"
+    )
+    return sorted(days - {getdate(day) for day in saved})
+
+
+def save_snapshot(period_type, start, end, values):
+    """Create or update the snapshot of one period"""
+    name = f"{period_type}-{start}"
+    if frappe.db.exists(SNAPSHOT, name):
+        doc = frappe.get_doc(SNAPSHOT, name)
+        doc.update(values)
+        doc.period_end = end
+        doc.save(ignore_permissions=True)
+    else:
+        doc = frappe.get_doc({
+            "doctype": SNAPSHOT,
+            "period_type": period_type,
+            "period_start": start,
+            "period_end": end,
+            **values
+        }).insert(ignore_permissions=True)
+    return doc
+
+
+def update_snapshots(day):
+    """Store the daily snapshot for `day` and refresh its week and month"""
+    day = getdate(day)
+    save_snapshot("Daily", day, day, compute_day(day))
+
+    for period_type, (start, end) in (("Weekly", week_bounds(day)), ("Monthly", month_bounds(day))):
+        save_snapshot(period_type, start, end, rollup(start, end))
+
+
+def update_report_snapshots():
+    """Snapshot every completed day since the last daily snapshot, a day per chunk"""
+    from gestion_tiempo.jobs import run_job
+
+    yesterday = getdate(add_days(nowdate(), -1))
+    last = frappe.db.get_value(SNAPSHOT, {"period_type": "Daily"}, "max(period_start)")
+    oldest = getdate(add_days(yesterday, -MAX_BACKFILL_DAYS + 1))
+    # A fresh site backfills the whole window so the first rollups have data
+    first = max(getdate(add_days(last, 1)), oldest) if last else oldest
+    days = [getdate(add_days(first, i)) for i in range((yesterday - first).days + 1)]
+
+    def fetch(after, limit):
+        return [day for day in days if str(day) > after][:limit]
+
+    def process(chunk):
+        for day in chunk:
+            update_snapshots(day)
+
+    return run_job("update_report_snapshots", fetch, process, run_key=str(yesterday), chunk_size=1)
+
+
+@frappe.whitelist()
+def get_report_snapshots(period_type="Daily", date_from=None, date_to=None):
+    """Get historical snapshots of one period type in a date range"""
+    if period_type not in PERIOD_TYPES:
+        frappe.throw(_("Invalid period type"))
+
+    filters = {"period_type": period_type}
+    if date_from and date_to:
+        filters["period_start"] = ["between", [date_from, date_to]]
+    elif date_from:
+        filters["period_start"] = [">=", date_from]
+    elif date_to:
+        filters["period_start"] = ["<=", date_to]
+
+    return frappe.get_all(
+        SNAPSHOT,
+        filters=filters,
+        fields=["period_type", "period_start", "period_end"] + METRICS,
+        order_by="period_start asc",
+        limit_page_length=0
+    )
+
+
+def setup_indexes():
+    """Composite index backing get_report_snapshots and the rollups"""
+    frappe.db.add_index(SNAPSHOT, ["period_type", "period_start"], index_name="period_index")
@@ -0,0 +1,135 @@
+import re
+
+import frappe
+from frappe import _
+from frappe.utils import cint
+
+
+FULLTEXT_INDEX = "customer_search"
+FULLTEXT_COLUMNS = ("full_name", "email", "company")
+# InnoDB ignores shorter tokens in FULLTEXT indexes (innodb_ft_min_token_size)
+MIN_TOKEN_SIZE = 3
+MAX_LIMIT = 50
+
+# Customer list filters that map to indexed columns, with their allowed operators
+CUSTOMER_FILTERS = {
+    "name": ("=", "in"),
+    "email": ("=", "in", "like"),
+    "full_name": ("=", "like"),
+    "company": ("=", "like"),
+    "creation": (">", ">=", "<", "<=", "between"),
+}
+
+
+def sanitize_filters(filters, allowed=CUSTOMER_FILTERS):
+    """Reject filters on columns without an index.
+
+    Accepts the dict form used by the backoffice ({field: value} or
+    {field: [operator, value]}). `like` is only allowed as a prefix match.
+    """
+    if not filters:
+        return {}
+    if not isinstance(filters, dict):
+        frappe.throw(_("Filters must be an object"))
+
+    for field, condition in filters.items():
+        if field not in allowed:
+            frappe.throw(_("Filtering by {0} is not allowed").format(field))
+
+        operator, value = ("=", condition)
+        if isinstance(condition, (list, tuple)):
+            if len(condition) != 2 or not isinstance(condition[0], str):
+                frappe.throw(_("Filter on {0} must be [operator, value]").format(field))
+            operator, value = condition[0].lower(), condition[1]
+
+        if operator not in allowed[field]:
+            frappe.throw(_("Operator {0} is not allowed for {1}").format(operator, field))
+        validate_filter_value(field, operator, value)
+
+    return filters
+
+
+def validate_filter_value(field, operator, value):
+    if operator == "in":
+        if not isinstance(value, (list, tuple)) or not value or not all(is_scalar(v) for v in value):
+            frappe.throw(_("Filter on {0} needs a non-empty list of values").format(field))
+    elif operator == "between":
+        if not isinstance(value, (list, tuple)) or len(value) != 2 or not all(is_scalar(v) for v in value):
+            frappe.throw(_("Filter on {0} needs a [from, to] range").format(field))
+    elif operator == "like":
+        # A leading wildcard (% or _) cannot use the index
+        if not isinstance(value, str) or not value or value[0] in "%_":
+            frappe.throw(_("Only prefix searches are allowed for {0}").format(field))
+    elif not is_scalar(value):
+        frappe.throw(_("Invalid value for filter on {0}").format(field))
+
+
+def is_scalar(value):
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+
+def tokenize(query):
+    """Split a search query into lowercase word tokens"""
+    return [token for token in re.split(r"[^\w]+", (query or "").lower()) if token]
+
+
+def escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@frappe.whitelist()
+def search_customers(query, limit=10):
+    """Typeahead search over customer name, email and company.
+
+    Queries with only long enough tokens use the FULLTEXT index in boolean
+    prefix mode and are ranked by relevance. Short queries fall back to
+    prefix matches on the indexed name and email columns. Searches every
+    customer, so admins only.
+    """
+    frappe.only_for("System Manager")
+    limit = min(max(cint(limit), 1), MAX_LIMIT)
+    query = (query or "").strip()
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    if "@" not in query and all(len(token) >= MIN_TOKEN_SIZE for token in tokens):
+        against = " ".join(f"+{token}*" for token in tokens)
+        columns = ", ".join(FULLTEXT_COLUMNS)
+        return frappe.db.sql(f"""
+            SELECT
+                name, full_name, email, company,
+                MATCH({columns}) AGAINST(%(against)s IN BOOLEAN MODE) as score
+            FROM `tabCustomer`
+            WHERE MATCH({columns}) AGAINST(%(against)s IN BOOLEAN MODE)
+            ORDER BY score DESC, full_name
+            LIMIT %(limit)s
+        """, {"against": against, "limit": limit}, as_dict=True)
+
+    prefix = escape_like(query.lower()) + "%"
+    return frappe.db.sql("""
+        SELECT name, full_name, email, company, MAX(score) as score
+        FROM (
+            SELECT name, full_name, email, company, 2 as score
+            FROM `tabCustomer`
+            WHERE email LIKE %(prefix)s
+            UNION
+            SELECT name, full_name, email, company, 1 as score
+            FROM `tabCustomer`
+            WHERE full_name LIKE %(prefix)s
+        ) matches
+        GROUP BY name, full_name, email, company
+        ORDER BY score DESC, full_name
+        LIMIT %(limit)s
+    """, {"prefix": prefix, "limit": limit}, as_dict=True)
+
+
+def setup_indexes():
+    """FULLTEXT index used by search_customers"""
+    exists = frappe.db.sql(
+        "SHOW INDEX FROM `tabCustomer` WHERE Key_name = %s", (FULLTEXT_INDEX,)
+    )
+    if not exists:
+        frappe.db.sql_ddl(
+            f"ALTER TABLE `tabCustomer` ADD FULLTEXT INDEX `{FULLTEXT_INDEX}` ({', '.join(FULLTEXT_COLUMNS)})"
+        )
@@ -1,84 +1,92 @@
 import frappe
-from frappe.utils import nowdate, add_days, getdate
+from frappe.utils import nowdate, add_days
+
+from gestion_tiempo.jobs import run_job
+from gestion_tiempo.utils import bulk_insert_usage_logs
 
 
 def check_expiring_subscriptions():
     """Check for subscriptions expiring in the next 7 days and send notifications"""
-    seven_days_from_now = add_days(nowdate(), 7)
-
-    expiring_subscriptions = frappe.get_all(
-        "Subscription",
-        filters={
-            "status": "Active",
-            "end_date": ["<=", seven_days_from_now],
-            "end_date": [">=", nowdate()]
-        },
-        fields=["name", "customer", "plan", "end_date"]
-    )
-
-    for sub in expiring_subscriptions:
-        customer = frappe.get_doc("Customer", sub.customer)
-        plan = frappe.get_doc("Subscription Plan", sub.plan)
-
-        # Log the expiring subscription
-        frappe.get_doc({
-            "doctype": "Usage Log",
-            "customer": sub.customer,
-            "feature": "subscription_expiring",
-            "details": f"Subscription to {plan.plan_name} expires on {sub.end_date}",
-            "log_date": nowdate()
-        }).insert(ignore_permissions=True)
+    today = nowdate()
+    seven_days_from_now = add_days(today, 7)
+
+    def fetch(after, limit):
+        return frappe.db.sql("""
+            SELECT s.name, s.customer, s.end_date, sp.plan_name, c.email
+            FROM `tabSubscription` s
+            JOIN `tabSubscription Plan` sp ON s.plan = sp.name
+            JOIN `tabCustomer` c ON s.customer = c.name
+            WHERE s.status = 'Active'
+            AND s.end_date BETWEEN %s AND %s
+            AND s.name > %s
+            ORDER BY s.name
+            LIMIT %s
+        """, (today, seven_days_from_now, after, limit), as_dict=True)
+
+    def process(subscriptions):
+        # Log the expiring subscriptions
+        bulk_insert_usage_logs([
+            (
+                sub.customer,
+                "subscription_expiring",
+                f"Subscription to {sub.plan_name} expires on {sub.end_date}"
+            )
+            for sub in subscriptions
+        ])
 
         # Here you would typically send an email notification
-        # frappe.sendmail(
-        #     recipients=[customer.email],
-        #     subject=f"Tu suscripción a {plan.plan_name} está por vencer",
-        #     message=f"Tu suscripción vence el {sub.end_date}. Renueva ahora para no perder acceso."
-        # )
+        # for sub in subscriptions:
+        #     frappe.sendmail(
+        #         recipients=[sub.email],
+        #         subject=f"Tu suscripción a {sub.plan_name} está por vencer",
+        #         message=f"Tu suscripción vence el {sub.end_date}. Renueva ahora para no perder acceso."
+        #     )
+
+    return run_job(
+        "check_expiring_subscriptions",
+        fetch,
+        process,
+        run_key=today,
+        checkpoint_of=lambda sub: sub.name
+    )
 
 
 def generate_weekly_report():
-    """Generate weekly subscription and revenue report"""
-    from frappe.utils import add_days
+    """Persist the report of the last completed week as a Report Snapshot.
+
+    Daily snapshots belong to update_report_snapshots, which is run (or
+    waited for, if another worker is running it) first. Any day it did not
+    cover is computed here, and the week is then rolled up from them.
+    """
+    from gestion_tiempo.jobs import wait_for_lock
+    from gestion_tiempo.reports import (
+        missing_daily_snapshots, rollup, save_snapshot, update_report_snapshots, update_snapshots, week_bounds
+    )
 
-    week_ago = add_days(nowdate(), -7)
+    week_start, week_end = week_bounds(add_days(nowdate(), -7))
 
-    # New subscriptions this week
-    new_subscriptions = frappe.db.count(
-        "Subscription",
-        filters={"creation": [">=", week_ago]}
-    )
+    if not update_report_snapshots():
+        wait_for_lock("update_report_snapshots")
+        update_report_snapshots()
+    missing = missing_daily_snapshots(week_start, week_end)
+    for day in missing:
+        update_snapshots(day)
+    if missing:
+        frappe.db.commit()
 
-    # Cancelled subscriptions this week
-    cancelled_subscriptions = frappe.db.count(
-        "Subscription",
-        filters={
-            "status": "Cancelled",
-            "modified": [">=", week_ago]
-        }
-    )
+    def fetch(after, limit):
+        return [week_start] if after < str(week_start) else []
 
-    # Revenue this week
-    revenue = frappe.db.sql("""
-        SELECT COALESCE(SUM(amount), 0) as total
-        FROM `tabPayment`
-        WHERE status = 'Completed'
-        AND payment_date >= %s
-    """, (week_ago,), as_dict=True)
-
-    weekly_revenue = revenue[0].total if revenue else 0
-
-    # Log the report
-    report_data = {
-        "new_subscriptions": new_subscriptions,
-        "cancelled_subscriptions": cancelled_subscriptions,
-        "weekly_revenue": weekly_revenue,
-        "report_date": nowdate()
-    }
+    def process(chunk):
+        save_snapshot("Weekly", week_start, week_end, rollup(week_start, week_end))
 
-    frappe.log_error(
-        title="Weekly Subscription Report",
-        message=str(report_data)
-    )
+    if not run_job("generate_weekly_report", fetch, process, run_key=str(week_start), chunk_size=1):
+        return None
 
-    return report_data
+    snapshot = frappe.get_doc("Report Snapshot", f"Weekly-{week_start}")
+    return {
+        "new_subscriptions": snapshot.new_subscriptions,
+        "cancelled_subscriptions": snapshot.cancelled_subscriptions,
+        "weekly_revenue": snapshot.revenue,
+        "report_date": nowdate()
+    }
@@ -0,0 +1,125 @@
+import unittest
+
+import numpy as np
+
+from gestion_tiempo.analytics import compute_cohorts, compute_plan_metrics, match_payments
+
+
+CURRENT_MONTH = 100
+
+
+def make_subs(rows, plans=("Basic", "Pro")):
+    """Subscription arrays from (name, plan_code, start_month, churn_month) rows sorted by name"""
+    names, plan_codes, start_month, churn_month = zip(*rows)
+    return {
+        "name": np.array(names, dtype=str),
+        "plan": np.array(plan_codes, dtype=np.int32),
+        "plans": np.array(plans, dtype=str),
+        "start_month": np.array(start_month, dtype=np.int32),
+        "churn_month": np.array(churn_month, dtype=np.int32),
+    }
+
+
+def make_payments(rows):
+    """Payment arrays from (subscription, amount, payment_month) rows"""
+    subscriptions, amounts, payment_month = zip(*rows)
+    return {
+        "subscription": np.array(subscriptions, dtype=str),
+        "amount": np.array(amounts, dtype=np.float64),
+        "payment_month": np.array(payment_month, dtype=np.int32),
+    }
+
+
+SUB_ROWS = [
+    ("S1", 0, 98, -1),   # first cohort, still active
+    ("S2", 0, 98, 99),   # first cohort, churned one month in
+    ("S3", 1, 99, -1),   # second cohort, still active
+    ("S4", 1, 97, -1),   # started before the window
+    ("S5", 0, 100, 100), # current cohort, churned in its first month
+    ("S6", 1, 101, -1),  # starts in the future
+]
+SUBS = make_subs(SUB_ROWS)
+
+PAYMENTS = make_payments([
+    ("S1", 10, 98),
+    ("S1", 10, 99),
+    ("S1", 7, 97),   # before the subscription started
+    ("S2", 10, 98),
+    ("S3", 20, 99),
+    ("S4", 50, 99),  # cohort outside the window
+    ("X9", 5, 99),   # unknown subscription
+    ("Z1", 5, 99),   # sorts after every subscription
+])
+
+
+class TestMatchPayments(unittest.TestCase):
+    def test_unknown_subscriptions_are_unmatched(self):
+        idx = match_payments(SUBS, PAYMENTS)
+
+        self.assertEqual(idx.tolist(), [0, 0, 0, 1, 2, 3, -1, -1])
+
+    def test_empty_inputs(self):
+        empty = make_payments([("S1", 0, 0)])
+        empty = {key: value[:0] for key, value in empty.items()}
+
+        self.assertEqual(len(match_payments(SUBS, empty)), 0)
+        self.assertEqual(match_payments({"name": np.array([], dtype=str)}, PAYMENTS).tolist(), [-1] * 8)
+
+
+class TestComputeCohorts(unittest.TestCase):
+    def setUp(self):
+        self.cohorts = {
+            row["cohort"]: row
+            for row in compute_cohorts(SUBS, PAYMENTS, CURRENT_MONTH, months=3)
+        }
+
+    def test_only_cohorts_in_window(self):
+        self.assertEqual(list(self.cohorts), ["0008-03", "0008-04", "0008-05"])
+        self.assertEqual([row["size"] for row in self.cohorts.values()], [2, 1, 1])
+
+    def test_retention_hides_unobserved_ages(self):
+        self.assertEqual(self.cohorts["0008-03"]["retention"], [1.0, 1.0, 0.5])
+        self.assertEqual(self.cohorts["0008-04"]["retention"], [1.0, 1.0, None])
+        self.assertEqual(self.cohorts["0008-05"]["retention"], [1.0, None, None])
+
+    def test_cumulative_revenue_per_subscription(self):
+        self.assertEqual(self.cohorts["0008-03"]["revenue_per_subscription"], [10.0, 15.0, 15.0])
+        self.assertEqual(self.cohorts["0008-04"]["revenue_per_subscription"], [20.0, 20.0, None])
+        self.assertEqual(self.cohorts["0008-05"]["revenue_per_subscription"], [0.0, None, None])
+
+    def test_churn_after_window_counts_as_retained(self):
+        subs = make_subs([("S1", 0, 98, 110)])
+        payments = make_payments([("S1", 10, 98)])
+
+        (cohort,) = compute_cohorts(subs, payments, CURRENT_MONTH, months=3)
+        self.assertEqual(cohort["retention"], [1.0, 1.0, 1.0])
+
+
+class TestComputePlanMetrics(unittest.TestCase):
+    def test_metrics_per_plan(self):
+        subs = make_subs(SUB_ROWS[:5])
+        basic, pro = compute_plan_metrics(subs, PAYMENTS, CURRENT_MONTH)
+
+        # Basic: S1 (3 months), S2 (2) and S5 (1) with two churned
+        self.assertEqual(basic, {
+            "plan": "Basic",
+            "subscriptions": 3,
+            "revenue": 37.0,
+            "arpu": 6.17,
+            "monthly_churn_rate": 33.33,
+            "ltv": 18.5,
+        })
+        # Pro: S3 (2 months) and S4 (4 months), none churned
+        self.assertEqual(pro, {
+            "plan": "Pro",
+            "subscriptions": 2,
+            "revenue": 70.0,
+            "arpu": 11.67,
+            "monthly_churn_rate": 0.0,
+            "ltv": None,
+        })
+
+    def test_no_plans(self):
+        subs = {"plans": np.array([], dtype=str)}
+
+        self.assertEqual(compute_plan_metrics(subs, PAYMENTS, CURRENT_MONTH), [])
@@ -0,0 +1,178 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import getdate
+
+from gestion_tiempo.billing import (
+    FakeGateway, acquire_lock, bill_shard, get_due_subscriptions, max_attempts, release_lock, write_batch
+)
+
+
+TEST_PLAN = "_Test Billing Plan"
+BILLING_DATE = "2000-01-01"
+CUSTOMERS = {
+    "ok": "_test_billing_ok@example.com",
+    "declined": "_test_billing_declined@example.com",
+}
+
+
+class TestBillShard(FrappeTestCase):
+    def setUp(self):
+        if not frappe.db.exists("Subscription Plan", TEST_PLAN):
+            frappe.get_doc({
+                "doctype": "Subscription Plan",
+                "plan_name": TEST_PLAN,
+                "price_monthly": 100,
+                "price_yearly": 1000
+            }).insert()
+
+        self.customers = {}
+        for key, email in CUSTOMERS.items():
+            customer = frappe.db.get_value("Customer", {"email": email}, "name")
+            if not customer:
+                customer = frappe.get_doc({
+                    "doctype": "Customer",
+                    "full_name": f"Test Billing {key}",
+                    "email": email
+                }).insert().name
+            self.customers[key] = customer
+
+        self.cleanup()
+        self.subscriptions = {
+            key: self.make_due_subscription(customer) for key, customer in self.customers.items()
+        }
+        frappe.db.commit()
+
+        self.gateway = FakeGateway(decline_customers=[self.customers["declined"]])
+        patcher = patch("gestion_tiempo.billing.get_gateway", return_value=self.gateway)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        frappe.db.rollback()
+        self.cleanup()
+        frappe.db.commit()
+
+    def cleanup(self):
+        customers = tuple(self.customers.values())
+        frappe.db.sql("DELETE FROM `tabPayment` WHERE customer IN %s", (customers,))
+        frappe.db.sql("DELETE FROM `tabSubscription` WHERE customer IN %s", (customers,))
+
+    def make_due_subscription(self, customer):
+        name = frappe.get_doc({
+            "doctype": "Subscription",
+            "customer": customer,
+            "plan": TEST_PLAN,
+            "status": "Active",
+            "billing_cycle": "Monthly",
+            "start_date": "2099-01-01",
+            "end_date": "2099-02-01",
+            "next_billing_date": "2099-02-01"
+        }).insert().name
+        # Backdate without hooks, which would mark a past end_date as Expired
+        self.rewind(name)
+        return name
+
+    def rewind(self, subscription):
+        frappe.db.set_value("Subscription", subscription, {
+            "start_date": "1999-12-01",
+            "end_date": BILLING_DATE,
+            "next_billing_date": BILLING_DATE
+        }, update_modified=False)
+
+    def bill(self):
+        return bill_shard(frappe.generate_hash(length=8), 0, 1, BILLING_DATE)
+
+    def payments(self, key):
+        return frappe.get_all(
+            "Payment",
+            filters={"subscription": self.subscriptions[key]},
+            fields=["status", "amount", "idempotency_key"],
+            order_by="creation asc, idempotency_key asc"
+        )
+
+    def end_date(self, key):
+        return getdate(frappe.db.get_value("Subscription", self.subscriptions[key], "end_date"))
+
+    def status(self, key):
+        return frappe.db.get_value("Subscription", self.subscriptions[key], "status")
+
+    def test_charges_and_renews(self):
+        totals = self.bill()
+
+        self.assertEqual(totals["charged"], 1)
+        self.assertEqual(totals["failed"], 1)
+        self.assertEqual(totals["amount"], 100)
+
+        (paid,) = self.payments("ok")
+        self.assertEqual(paid.status, "Completed")
+        self.assertEqual(paid.idempotency_key, f"{self.subscriptions['ok']}:{BILLING_DATE}:1")
+        self.assertEqual(self.end_date("ok"), getdate("2000-02-01"))
+
+    def test_declined_charge_keeps_subscription_due(self):
+        self.bill()
+
+        (failed,) = self.payments("declined")
+        self.assertEqual(failed.status, "Failed")
+        self.assertEqual(failed.idempotency_key, f"{self.subscriptions['declined']}:{BILLING_DATE}:1")
+        self.assertEqual(self.end_date("declined"), getdate(BILLING_DATE))
+        self.assertEqual(self.status("declined"), "Active")
+
+    def test_declined_charge_is_retried_then_expired(self):
+        limit = max_attempts()
+        for _attempt in range(limit):
+            self.bill()
+
+        failed = self.payments("declined")
+        self.assertEqual(
+            [row.idempotency_key for row in failed],
+            [f"{self.subscriptions['declined']}:{BILLING_DATE}:{n}" for n in range(1, limit + 1)]
+        )
+        self.assertEqual(self.status("declined"), "Expired")
+
+        # No longer due, so it is not charged again
+        self.bill()
+        self.assertEqual(len(self.payments("declined")), limit)
+
+    def test_rerun_skips_paid_renewal(self):
+        self.bill()
+        # Another run that read the subscription before it was renewed
+        self.rewind(self.subscriptions["ok"])
+        frappe.db.commit()
+
+        totals = self.bill()
+
+        self.assertEqual(totals["charged"], 0)
+        self.assertEqual(totals["skipped"], 1)
+        self.assertEqual(len(self.payments("ok")), 1)
+        self.assertEqual(self.end_date("ok"), getdate(BILLING_DATE))
+        # Only the declined renewal is tried again, with a new key
+        self.assertEqual(len(self.gateway.charges), 3)
+
+    def test_duplicate_payment_does_not_renew_twice(self):
+        self.bill()
+        self.rewind(self.subscriptions["ok"])
+
+        (sub,) = [
+            row for row in get_due_subscriptions(BILLING_DATE, 0, 1)
+            if row.name == self.subscriptions["ok"]
+        ]
+        sub.idempotency_key = f"{sub.name}:{sub.next_billing_date}:1"
+        renewed = write_batch([(sub, {"status": "Completed", "transaction_id": "fake_race"})])
+
+        self.assertEqual(renewed, [])
+        self.assertEqual(len(self.payments("ok")), 1)
+        self.assertEqual(self.end_date("ok"), getdate(BILLING_DATE))
+
+    def test_subscription_locked_by_another_run_is_skipped(self):
+        subscription = self.subscriptions["ok"]
+        self.assertTrue(acquire_lock(subscription, "other-run"))
+        try:
+            totals = self.bill()
+        finally:
+            release_lock(subscription, "other-run")
+
+        self.assertEqual(totals["skipped"], 1)
+        self.assertEqual(self.payments("ok"), [])
+        self.assertEqual(self.end_date("ok"), getdate(BILLING_DATE))
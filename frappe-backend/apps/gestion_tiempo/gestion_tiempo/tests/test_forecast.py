@@ -0,0 +1,85 @@
+import unittest
+
+import numpy as np
+
+from gestion_tiempo.forecast import project_revenue
+
+
+CURRENT_MONTH = 100
+
+
+def make_groups(rows):
+    """Group arrays from (is_yearly, billing_month, end_month, subscriptions, amount) rows"""
+    is_yearly, billing_month, end_month, subscriptions, amount = zip(*rows) if rows else ([],) * 5
+    return {
+        "is_yearly": np.array(is_yearly, dtype=bool),
+        "billing_month": np.array(billing_month, dtype=np.int32),
+        "end_month": np.array(end_month, dtype=np.int32),
+        "subscriptions": np.array(subscriptions, dtype=np.int64),
+        "amount": np.array(amount, dtype=np.float64),
+    }
+
+
+GROUPS = make_groups([
+    (False, 100, 100, 2, 20),   # two monthly at 10, renewing now
+    (False, 102, 102, 1, 30),   # one monthly at 30, renewing in two months
+    (True, 98, 98, 1, 120),     # one yearly at 120, overdue
+    (True, 105, 105, 3, 360),   # three yearly at 120, renewing in five months
+])
+
+
+def column(forecast, key):
+    return [row[key] for row in forecast]
+
+
+class TestProjectRevenue(unittest.TestCase):
+    def test_renewal_schedule(self):
+        forecast = project_revenue(GROUPS, CURRENT_MONTH, months=13)
+
+        self.assertEqual(forecast[0]["month"], "0008-05")
+        self.assertEqual(column(forecast, "renewals"), [3, 2, 3, 3, 3, 6, 3, 3, 3, 3, 3, 3, 4])
+        self.assertEqual(
+            column(forecast, "revenue"),
+            [140.0, 20.0, 50.0, 50.0, 50.0, 410.0, 50.0, 50.0, 50.0, 50.0, 50.0, 50.0, 170.0]
+        )
+
+    def test_expirations_in_horizon(self):
+        forecast = project_revenue(GROUPS, CURRENT_MONTH, months=6)
+
+        # The overdue yearly group ended before the horizon
+        self.assertEqual(column(forecast, "expirations"), [2, 0, 1, 0, 0, 3])
+        self.assertEqual(column(forecast, "mrr_at_risk"), [20.0, 0.0, 30.0, 0.0, 0.0, 30.0])
+
+    def test_mrr_without_churn_is_flat(self):
+        forecast = project_revenue(GROUPS, CURRENT_MONTH, months=6)
+
+        self.assertEqual(column(forecast, "mrr"), [90.0] * 6)
+        self.assertEqual(column(forecast, "arr"), [1080.0] * 6)
+        self.assertEqual(column(forecast, "expected_revenue"), column(forecast, "revenue"))
+
+    def test_churn_applies_at_renewals(self):
+        forecast = project_revenue(GROUPS, CURRENT_MONTH, months=6, churn_rate=10)
+        yearly_overdue = 10 * 0.9 ** 12
+
+        # Month 0: the first monthly group and the overdue yearly one renew
+        self.assertAlmostEqual(forecast[0]["mrr"], 20 * 0.9 + 30 + yearly_overdue + 30, places=2)
+        self.assertAlmostEqual(forecast[0]["expected_revenue"], 20 * 0.9 + 120 * 0.9 ** 12, places=2)
+        # Month 2: the second monthly group renews for the first time
+        self.assertAlmostEqual(forecast[2]["mrr"], 20 * 0.9 ** 3 + 30 * 0.9 + yearly_overdue + 30, places=2)
+        # Month 5: the yearly group drops a year of churn at once
+        self.assertAlmostEqual(
+            forecast[5]["mrr"], 20 * 0.9 ** 6 + 30 * 0.9 ** 4 + yearly_overdue + 30 * 0.9 ** 12, places=2
+        )
+        mrr = column(forecast, "mrr")
+        self.assertEqual(mrr, sorted(mrr, reverse=True))
+        # Billed revenue ignores churn
+        self.assertEqual(forecast[5]["revenue"], 410.0)
+
+    def test_no_subscriptions(self):
+        forecast = project_revenue(make_groups([]), CURRENT_MONTH, months=3)
+
+        self.assertEqual(len(forecast), 3)
+        for row in forecast:
+            self.assertEqual(row["renewals"], 0)
+            self.assertEqual(row["mrr"], 0.0)
+            self.assertEqual(row["expirations"], 0)
@@ -0,0 +1,46 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from gestion_tiempo.search import sanitize_filters
+
+
+class TestSanitizeFilters(FrappeTestCase):
+    def test_allowed_filters_pass(self):
+        filters = {
+            "email": ["like", "ana%"],
+            "name": ["in", ["CUST-2024-00001", "CUST-2024-00002"]],
+            "company": "Acme",
+            "creation": ["between", ["2024-01-01", "2024-12-31"]],
+        }
+
+        self.assertEqual(sanitize_filters(filters), filters)
+        self.assertEqual(sanitize_filters(None), {})
+
+    def test_unindexed_field_or_operator_is_rejected(self):
+        for filters in (
+            {"phone": "600000000"},
+            {"full_name": ["in", ["Ana"]]},
+            {"creation": ["=", "2024-01-01"]},
+        ):
+            with self.subTest(filters=filters):
+                self.assertRaises(frappe.ValidationError, sanitize_filters, filters)
+
+    def test_malformed_conditions_are_rejected(self):
+        for filters in (
+            {"email": []},
+            {"email": ["like"]},
+            {"email": ["like", "a%", "extra"]},
+            {"creation": [1, 2]},
+            {"creation": ["between", "2024-01-01"]},
+            {"creation": ["between", ["2024-01-01"]]},
+            {"name": ["in", []]},
+            {"name": ["in", "CUST-2024-00001"]},
+            {"company": {"like": "a%"}},
+        ):
+            with self.subTest(filters=filters):
+                self.assertRaises(frappe.ValidationError, sanitize_filters, filters)
+
+    def test_leading_wildcards_are_rejected(self):
+        for pattern in ("%bc", "_bc", "", None):
+            with self.subTest(pattern=pattern):
+                self.assertRaises(frappe.ValidationError, sanitize_filters, {"email": ["like", pattern]})
@@ -0,0 +1,42 @@
+import frappe
+from frappe.utils import cint
+
+
+def reserve_names(prefix, count):
+    """Reserve `count` consecutive names from a naming series in one update"""
+    from frappe.model.naming import parse_naming_series
+
+    series = parse_naming_series(prefix)
+    frappe.db.sql("""
+        INSERT INTO `tabSeries` (name, current) VALUES (%s, 0)
+        ON DUPLICATE KEY UPDATE name = name
+    """, (series,))
+    frappe.db.sql("UPDATE `tabSeries` SET current = current + %s WHERE name = %s", (count, series))
+    last = cint(frappe.db.sql("SELECT current FROM `tabSeries` WHERE name = %s", (series,))[0][0])
+
+    return [f"{series}{i:05d}" for i in range(last - count + 1, last + 1)]
+
+
+def bulk_insert_usage_logs(logs):
+    """Insert Usage Log rows in one statement.
+
+    `logs` is a list of (customer, feature, details) tuples. Skips the
+    document lifecycle, so use it only for audit entries.
+    """
+    if not logs:
+        return
+
+    from frappe.utils import now_datetime, nowdate
+
+    now = now_datetime()
+    user = frappe.session.user
+    names = reserve_names("LOG-.YYYY.-", len(logs))
+    fields = [
+        "name", "creation", "modified", "owner", "modified_by", "docstatus",
+        "customer", "feature", "details", "log_date", "count", "naming_series"
+    ]
+    values = [
+        (name, now, now, user, user, 0, customer, feature, details, nowdate(), 1, "LOG-.YYYY.-.#####")
+        for name, (customer, feature, details) in zip(names, logs)
+    ]
+    frappe.db.bulk_insert("Usage Log", fields, values)
@@ -59,6 +59,16 @@ class FrappeAPI {
         }
     }
 
+    /**
+     * Convert a compact { columns, rows } table back to an array of objects
+     * @param {Object} table - Compact table
+     * @returns {Array<Object>} - Rows as objects
+     */
+    expandColumns(table) {
+        const { columns, rows } = table;
+        return rows.map(row => Object.fromEntries(columns.map((column, i) => [column, row[i]])));
+    }
+
     // ==================== Authentication ====================
 
     /**
@@ -105,15 +115,55 @@ class FrappeAPI {
         return this.request('/api/method/gestion_tiempo.api.get_dashboard_stats');
     }
 
+    /**
+     * Get cohort retention, ARPU and LTV by plan
+     * @param {number} months - Number of monthly cohorts to include
+     * @returns {Promise<Object>} - Cohort analytics
+     */
+    async getCohortAnalytics(months = 12) {
+        return this.request(`/api/method/gestion_tiempo.analytics.get_cohort_analytics?months=${months}`);
+    }
+
+    /**
+     * Get MRR/ARR forecast from the renewal schedule
+     * @param {number} months - Months to project
+     * @param {number} churnRate - Expected monthly churn percentage
+     * @returns {Promise<Object>} - Monthly forecast
+     */
+    async getRevenueForecast(months = 12, churnRate = 0) {
+        const params = new URLSearchParams({ months: months.toString(), churn_rate: churnRate.toString() });
+        return this.request(`/api/method/gestion_tiempo.forecast.get_revenue_forecast?${params}`);
+    }
+
+    /**
+     * Listen for live dashboard deltas over Frappe's socket.io service.
+     * Requires the socket.io client (window.io) to be loaded.
+     * @param {string} siteName - Frappe site name (socket.io namespace)
+     * @param {Function} onDelta - Called with { mrr, revenue, new_payments, status_changes, ... }
+     * @returns {Function} - Call to disconnect
+     */
+    subscribeDashboard(siteName, onDelta) {
+        if (typeof window.io !== 'function') {
+            console.warn('socket.io client not loaded, dashboard will not update live');
+            return () => {};
+        }
+
+        const socket = window.io(`${this.baseUrl}/${siteName}`, { withCredentials: true });
+        socket.on('connect', () => socket.emit('doctype_subscribe', 'Subscription'));
+        socket.on('dashboard_delta', onDelta);
+
+        return () => socket.disconnect();
+    }
+
     // ==================== Customers ====================
 
     /**
      * Get list of customers with pagination
-     * @param {Object} params - Query parameters
+     * @param {Object} params - Query parameters (responseFormat: 'columns' for compact rows)
      * @returns {Promise<Object>} - Paginated customers list
      */
     async getCustomers(params = {}) {
-        const { filters, page = 1, pageSize = 20 } = params;
+        const { filters, page = 1, pageSize = 20, responseFormat } = params;
         const queryParams = new URLSearchParams({
             page: page.toString(),
             page_size: pageSize.toString()
@@ -122,10 +172,24 @@ class FrappeAPI {
         if (filters) {
             queryParams.append('filters', JSON.stringify(filters));
         }
+        if (responseFormat) {
+            queryParams.append('response_format', responseFormat);
+        }
 
         return this.request(`/api/method/gestion_tiempo.api.get_customers_list?${queryParams}`);
     }
 
+    /**
+     * Typeahead search over customer name, email and company
+     * @param {string} query - Search text
+     * @param {number} limit - Max results
+     * @returns {Promise<Array>} - Matching customers ranked by relevance
+     */
+    async searchCustomers(query, limit = 10) {
+        const params = new URLSearchParams({ query, limit: limit.toString() });
+        return this.request(`/api/method/gestion_tiempo.search.search_customers?${params}`);
+    }
+
     /**
      * Get customer details by email
      * @param {string} email - Customer email
@@ -185,11 +249,11 @@ class FrappeAPI {
 
     /**
      * Get list of subscriptions with pagination
-     * @param {Object} params - Query parameters
+     * @param {Object} params - Query parameters (responseFormat: 'columns' for compact rows)
      * @returns {Promise<Object>} - Paginated subscriptions list
      */
     async getSubscriptions(params = {}) {
-        const { filters, page = 1, pageSize = 20 } = params;
+        const { filters, page = 1, pageSize = 20, responseFormat } = params;
         const queryParams = new URLSearchParams({
             page: page.toString(),
             page_size: pageSize.toString()
@@ -198,6 +262,9 @@ class FrappeAPI {
         if (filters) {
             queryParams.append('filters', JSON.stringify(filters));
         }
+        if (responseFormat) {
+            queryParams.append('response_format', responseFormat);
+        }
 
         return this.request(`/api/method/gestion_tiempo.api.get_subscriptions_list?${queryParams}`);
     }
@@ -281,11 +348,11 @@ class FrappeAPI {
 
     /**
      * Get list of payments with pagination
-     * @param {Object} params - Query parameters
+     * @param {Object} params - Query parameters (responseFormat: 'columns' for compact rows)
      * @returns {Promise<Object>} - Paginated payments list
      */
     async getPayments(params = {}) {
-        const { filters, page = 1, pageSize = 20 } = params;
+        const { filters, page = 1, pageSize = 20, responseFormat } = params;
         const queryParams = new URLSearchParams({
             page: page.toString(),
             page_size: pageSize.toString()
@@ -294,6 +361,9 @@ class FrappeAPI {
         if (filters) {
             queryParams.append('filters', JSON.stringify(filters));
         }
+        if (responseFormat) {
+            queryParams.append('response_format', responseFormat);
+        }
 
         return this.request(`/api/method/gestion_tiempo.api.get_payments_list?${queryParams}`);
     }
@@ -317,25 +387,80 @@ class FrappeAPI {
      * @param {string} reportType - Type of report (customers, subscriptions, payments, revenue)
      * @param {string} dateFrom - Start date
      * @param {string} dateTo - End date
-     * @returns {Promise<Array>} - Report data
+     * @param {string|null} responseFormat - 'columns' for a compact { columns, rows } table
+     * @returns {Promise<Array|Object>} - Report data
      */
-    async exportReport(reportType, dateFrom = null, dateTo = null) {
+    async exportReport(reportType, dateFrom = null, dateTo = null, responseFormat = null) {
         const params = new URLSearchParams({ report_type: reportType });
 
         if (dateFrom) params.append('date_from', dateFrom);
         if (dateTo) params.append('date_to', dateTo);
+        if (responseFormat) params.append('response_format', responseFormat);
 
         return this.request(`/api/method/gestion_tiempo.api.export_report?${params}`);
     }
 
+    // ==================== Sync ====================
+
+    /**
+     * Get changes since a sync cursor
+     * @param {string|null} cursor - Cursor returned by the previous call
+     * @param {number} limit - Max rows per doctype
+     * @returns {Promise<Object>} - { changes, cursor, has_more }
+     */
+    async getChanges(cursor = null, limit = 500) {
+        const params = new URLSearchParams({ limit: limit.toString() });
+        if (cursor) params.append('cursor', cursor);
+
+        return this.request(`/api/method/gestion_tiempo.changes.changes_since?${params}`);
+    }
+
+    /**
+     * Pull every pending change, page by page
+     * @param {string|null} cursor - Last stored cursor
+     * @param {Function} onChanges - Called with each page of changes and a reset flag;
+     *   when reset is true the cursor had expired and the local copy must be cleared first
+     * @returns {Promise<string>} - Cursor to store for the next sync
+     */
+    async syncChanges(cursor, onChanges) {
+        let result;
+        do {
+            result = await this.getChanges(cursor);
+            await onChanges(result.changes, result.reset);
+            cursor = result.cursor;
+        } while (result.has_more);
+
+        return cursor;
+    }
+
+    /**
+     * Get historical report snapshots
+     * @param {string} periodType - 'Daily', 'Weekly' or 'Monthly'
+     * @param {string} dateFrom - First period start
+     * @param {string} dateTo - Last period start
+     * @returns {Promise<Array>} - Snapshots ordered by period
+     */
+    async getReportSnapshots(periodType = 'Daily', dateFrom = null, dateTo = null) {
+        const params = new URLSearchParams({ period_type: periodType });
+
+        if (dateFrom) params.append('date_from', dateFrom);
+        if (dateTo) params.append('date_to', dateTo);
+
+        return this.request(`/api/method/gestion_tiempo.reports.get_report_snapshots?${params}`);
+    }
+
     // ==================== Utility Methods ====================
 
     /**
      * Convert data to CSV and trigger download
-     * @param {Array} data - Data array
+     * @param {Array|Object} data - Data array or compact { columns, rows } table
      * @param {string} filename - File name
      */
     downloadAsCSV(data, filename) {
+        if (data && data.columns) {
+            data = this.expandColumns(data);
+        }
+
         if (!data || data.length === 0) {
             console.warn('No data to export');
             return;